@@ -0,0 +1,243 @@
+"""Micro-benchmarks for utilities/custom_indicators.py
+
+Runs every indicator on deterministic synthetic OHLCV data over a grid of
+bar counts and pair counts, and reports per call:
+    - wall time (best of --repeat passes over the pairs, tracemalloc off)
+    - peak traced memory during the call
+    - allocations: count and KB of the memory blocks the call allocated,
+      from tracemalloc statistics (per source line) taken before the call
+      and right after it, its result still referenced. Temporaries freed
+      before the call returns are not in these statistics, their size is
+      in the peak.
+
+Usage (from the repository root):
+    python benchmarks/indicators_bench.py                  # full grid
+    python benchmarks/indicators_bench.py --bars 1000 10000 --pairs 1 30
+    python benchmarks/indicators_bench.py --save            # store baseline
+    python benchmarks/indicators_bench.py --compare         # exit 1 on regression
+
+Every cell of the grid is measured. When a pass over all the pairs would
+exceed --max-seconds, the pass stops there (at least one call per cell) and
+the total for the pairs is extrapolated from the calls made, shown with a
+"~". Peak and allocations do not depend on the pair count and are traced
+once per indicator and bar count.
+
+The baseline (benchmarks/baselines/indicators.json) holds timings of the
+machine that saved it, with its platform and library versions under
+"_machine". Regenerate it on the machine running --compare, before the
+change to check:
+    git stash && python benchmarks/indicators_bench.py --save && git stash pop
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from utilities.custom_indicators import (
+    Trix,
+    VMC,
+    SuperTrend,
+    MaSlope,
+    SmoothedHeikinAshi,
+    heikinAshiDf,
+    chop,
+    volume_anomality,
+)
+
+DEFAULT_BARS = [1000, 10000, 100000]
+DEFAULT_PAIRS = [1, 30, 300]
+# distinct synthetic series kept in memory, larger pair counts cycle through them
+FRAME_POOL = 30
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "indicators.json"
+# indicators writing their columns into the input frame, called on a copy
+MUTATES_INPUT = {"heikinAshiDf"}
+
+INDICATORS = {
+    "Trix": lambda df: Trix(df["close"]).get_trix_histo(),
+    "VMC": lambda df: _vmc(df),
+    "SuperTrend": lambda df: SuperTrend(df["high"], df["low"], df["close"]).super_trend_direction(),
+    "MaSlope": lambda df: MaSlope(df["close"], df["high"], df["low"]).x_angle(),
+    "SmoothedHeikinAshi": lambda df: SmoothedHeikinAshi(
+        df["open"], df["high"], df["low"], df["close"]
+    ).smoothed_ha_close(),
+    "heikinAshiDf": lambda df: heikinAshiDf(df),
+    "chop": lambda df: chop(df["high"], df["low"], df["close"]),
+    "volume_anomality": lambda df: volume_anomality(df),
+}
+
+
+def _vmc(df):
+    vmc = VMC(df["open"], df["high"], df["low"], df["close"])
+    return vmc.wave_1(), vmc.wave_2(), vmc.money_flow()
+
+
+def synthetic_ohlcv(bars, seed=0) -> pd.DataFrame:
+    """Deterministic hourly random-walk candles"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    open = np.concatenate(([close[0]], close[:-1]))
+    high = np.maximum(open, close) * (1 + rng.uniform(0, 0.01, bars))
+    low = np.minimum(open, close) * (1 - rng.uniform(0, 0.01, bars))
+    volume = rng.lognormal(10, 1, bars)
+    return pd.DataFrame(
+        {"open": open, "high": high, "low": low, "close": close, "volume": volume},
+        index=pd.date_range("2020-01-01", periods=bars, freq="h"),
+    )
+
+
+def machine() -> dict:
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+
+def time_call(func, dfs, pairs, repeat, max_seconds, copy_input):
+    """Best wall time in seconds for one pass over `pairs` frames, and the
+    number of calls it is measured on (fewer than pairs when a pass would
+    exceed max_seconds, the time is then extrapolated to the pairs)
+    """
+    best = float("inf")
+    calls = pairs
+    for _ in range(repeat):
+        gc.collect()
+        elapsed = 0.0
+        for i in range(pairs):
+            df = dfs[i % len(dfs)]
+            if copy_input:
+                df = df.copy()
+            start = time.perf_counter()
+            func(df)
+            elapsed += time.perf_counter() - start
+            if elapsed > max_seconds and i + 1 < pairs:
+                calls = i + 1
+                return elapsed / calls * pairs, calls
+        best = min(best, elapsed)
+        if best > 1:
+            break
+    return best, calls
+
+
+def trace_call(func, df, copy_input):
+    """Peak bytes, allocated blocks and allocated bytes of a single call"""
+    if copy_input:
+        df = df.copy()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    result = func(df)
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = [stat for stat in after.compare_to(before, "lineno") if stat.size_diff > 0]
+    del result
+    return peak, sum(stat.count_diff for stat in stats if stat.count_diff > 0), sum(stat.size_diff for stat in stats)
+
+
+def run(names, bars_list, pairs_list, repeat, max_seconds):
+    results = {}
+    for name in names:
+        func = INDICATORS[name]
+        copy_input = name in MUTATES_INPUT
+        for bars in bars_list:
+            dfs = [synthetic_ohlcv(bars, seed) for seed in range(min(max(pairs_list), FRAME_POOL))]
+            peak, allocs, alloc_bytes = trace_call(func, dfs[0], copy_input)
+            for pairs in sorted(pairs_list):
+                elapsed, calls = time_call(func, dfs, pairs, repeat, max_seconds, copy_input)
+                results[f"{name}|{bars}|{pairs}"] = {
+                    "seconds_per_call": elapsed / pairs,
+                    "total_seconds": elapsed,
+                    "calls": calls,
+                    "peak_kb": round(peak / 1024, 1),
+                    "allocs": allocs,
+                    "alloc_kb": round(alloc_bytes / 1024, 1),
+                }
+                print_row(name, bars, pairs, results[f"{name}|{bars}|{pairs}"])
+    return results
+
+
+def print_row(name, bars, pairs, result):
+    total = f"{'~' if result['calls'] < pairs else ''}{result['total_seconds']:.3f}"
+    print(
+        f"{name:<20}{bars:>8}{pairs:>6}"
+        f"{result['seconds_per_call'] * 1000:>12.3f}{total:>10}"
+        f"{result['peak_kb']:>12.1f}{result['allocs']:>9}{result['alloc_kb']:>12.1f}"
+    )
+
+
+def compare(results, baseline, tolerance):
+    """Return the keys slower (or hungrier) than baseline x tolerance"""
+    regressions = []
+    for key, result in results.items():
+        ref = baseline.get(key)
+        if ref is None:
+            continue
+        for metric in ["seconds_per_call", "peak_kb"]:
+            if result[metric] > ref[metric] * tolerance:
+                regressions.append(
+                    f"{key} {metric}: {result[metric]:.6g} > {ref[metric]:.6g} x {tolerance}"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--indicators", nargs="+", default=list(INDICATORS), choices=list(INDICATORS))
+    parser.add_argument("--bars", nargs="+", type=int, default=DEFAULT_BARS)
+    parser.add_argument("--pairs", nargs="+", type=int, default=DEFAULT_PAIRS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-seconds", type=float, default=5, help="time spent per cell at most")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="write results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="fail if slower than the baseline")
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    args = parser.parse_args()
+
+    warnings.simplefilter("ignore")
+    print(
+        f"{'indicator':<20}{'bars':>8}{'pairs':>6}{'ms/call':>12}{'total s':>10}"
+        f"{'peak KB':>12}{'allocs':>9}{'alloc KB':>12}"
+    )
+    results = run(args.indicators, args.bars, args.pairs, args.repeat, args.max_seconds)
+
+    if args.save:
+        baseline = {}
+        if args.baseline.exists():
+            baseline = json.loads(args.baseline.read_text())
+        baseline.update(results)
+        baseline["_machine"] = machine()
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True))
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.compare:
+        if not args.baseline.exists():
+            print(f"No baseline at {args.baseline}, run with --save first")
+            sys.exit(2)
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get("_machine") != machine():
+            print(f"Baseline saved on another machine or versions: {baseline.get('_machine')}")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regression against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Record a live strategy run, then time it replayed with no network
+
+Record once (real exchange, real orders), from the repository root:
+    python benchmarks/strategy_replay.py record strategies/envelopes/multi_bitget.py
+
+Then time the run replayed from the cassette, before and after a change:
+    python benchmarks/strategy_replay.py replay strategies/envelopes/multi_bitget.py
+    python benchmarks/strategy_replay.py replay strategies/envelopes/multi_bitget.py --latency-scale 1
+
+Exchange responses are served by utilities/recorder.py, with no delay or the
+recorded latencies times --latency-scale. Each replayed run starts from a
+fresh copy of the repository (tracking files, caches) taken before the
+first one, so runs are identical and the working tree is left untouched.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+CASSETTE_DIR = Path(__file__).resolve().parent / "cassettes"
+COPY_IGNORE = shutil.ignore_patterns(".git", ".venv", "trading-dashboard", "benchmarks", "__pycache__")
+
+
+def cassette_path(script) -> Path:
+    return CASSETTE_DIR / f"{Path(script).stem}.jsonl.gz"
+
+
+def run(script, cwd, env) -> float:
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, str(Path(cwd) / script)],
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    seconds = time.perf_counter() - start
+    if result.returncode != 0:
+        print(result.stdout.decode(errors="replace"))
+        sys.exit(f"{script} exited with code {result.returncode}")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("script", help="strategy script, relative to the repository root")
+    parser.add_argument("--cassette", type=Path, default=None)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency-scale", type=float, default=0.0)
+    args = parser.parse_args()
+    cassette = args.cassette if args.cassette is not None else cassette_path(args.script)
+
+    env = dict(os.environ)
+    env["LIVE_TOOLS_CASSETTE"] = str(cassette.resolve())
+    env["LIVE_TOOLS_CASSETTE_MODE"] = args.mode
+    env["LIVE_TOOLS_LATENCY_SCALE"] = str(args.latency_scale)
+
+    if args.mode == "record":
+        env["PYTHONPATH"] = os.pathsep.join([str(ROOT), env.get("PYTHONPATH", "")])
+        seconds = run(args.script, ROOT, env)
+        print(f"Recorded {args.script} in {seconds:.2f}s to {cassette}")
+        return
+
+    if not cassette.exists():
+        sys.exit(f"No cassette {cassette}, record one first")
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = Path(tmp) / "snapshot"
+        shutil.copytree(ROOT, snapshot, ignore=COPY_IGNORE)
+        times = []
+        for i in range(args.repeat):
+            workdir = Path(tmp) / f"run{i}"
+            shutil.copytree(snapshot, workdir)
+            env["PYTHONPATH"] = os.pathsep.join([str(workdir), os.environ.get("PYTHONPATH", "")])
+            times.append(run(args.script, workdir, env))
+            shutil.rmtree(workdir)
+
+    print(
+        f"{args.script} replayed {args.repeat} times (latency x{args.latency_scale}):"
+        f" best {min(times):.3f}s, median {statistics.median(times):.3f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
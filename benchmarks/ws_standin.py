@@ -0,0 +1,252 @@
+"""Local stand-in for the Bitget public WebSocket, to run the streams offline
+
+Serve the stand-in alone (e.g. for a strategy started with
+ws_urls={"public": "ws://127.0.0.1:8790/ws", "private": "ws://127.0.0.1:8790/ws"}):
+    python benchmarks/ws_standin.py serve
+
+Or serve it and stream from it with PerpBitget.start_stream, printing every
+candle close and the delay between the server sending the next candle and
+the LiveView callback:
+    python benchmarks/ws_standin.py run --pairs BTC/USDT ETH/USDT --candles 20
+
+The server answers the v2 subscribe requests of the candle and ticker
+channels (private channels are acknowledged but get no data) and sends a
+new candle every --candle-seconds, each one closing the previous one, with
+an update of the open candle and a ticker in between. Prices are a
+deterministic random walk per pair.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+from aiohttp import WSMsgType, web
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from utilities.bitget_perp import PerpBitget
+from utilities.multi_timeframe import TIMEFRAME_MS
+
+# Bitget v2 candle channels, by ccxt timeframe
+CANDLE_CHANNELS = {
+    "1m": "candle1m",
+    "5m": "candle5m",
+    "15m": "candle15m",
+    "30m": "candle30m",
+    "1h": "candle1H",
+    "4h": "candle4H",
+    "1d": "candle1D",
+}
+
+
+class StandinServer:
+    """ Bitget like public WebSocket on host:port/ws
+
+        Candle timestamps start at start_ts and advance by the channel
+        timeframe on every new candle, sent every candle_seconds, so a day
+        of 1h candles runs in seconds. sent_at[(inst_id, timeframe, ts)] is
+        the time the candle after ts was sent (ts closed).
+    """
+
+    def __init__(self, host="127.0.0.1", port=8790, candle_seconds=0.5, candles=None, start_ts=None, seed=0):
+        self.host = host
+        self.port = port
+        self.candle_seconds = candle_seconds
+        self.candles = candles
+        self.start_ts = start_ts if start_ts is not None else int(time.time() * 1000) // TIMEFRAME_MS["1d"] * TIMEFRAME_MS["1d"]
+        self.seed = seed
+        self.sent_at = {}
+        self._runner = None
+        self._tasks = []
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/ws", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        print(f"Stand-in listening on ws://{self.host}:{self.port}/ws")
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _handle(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            if msg.data == "ping":
+                await ws.send_str("pong")
+                continue
+            data = json.loads(msg.data)
+            if data.get("op") == "login":
+                await ws.send_str(json.dumps({"event": "login", "code": 0, "msg": ""}))
+                continue
+            for arg in data.get("args", []):
+                await ws.send_str(json.dumps({"event": data.get("op", "subscribe"), "arg": arg}))
+                if data.get("op") != "subscribe":
+                    continue
+                timeframes = {channel: timeframe for timeframe, channel in CANDLE_CHANNELS.items()}
+                if arg.get("channel") in timeframes:
+                    self._spawn(self._push_candles(ws, arg, timeframes[arg["channel"]]))
+                elif arg.get("channel") == "ticker":
+                    self._spawn(self._push_tickers(ws, arg))
+        return ws
+
+    def _spawn(self, coroutine):
+        self._tasks.append(asyncio.ensure_future(coroutine))
+
+    def _prices(self, inst_id):
+        rng = random.Random(f"{self.seed}-{inst_id}")
+        price = 100.0
+        while True:
+            price *= 1 + rng.gauss(0, 0.01)
+            yield price
+
+    async def _push_candles(self, ws, arg, timeframe):
+        inst_id = arg["instId"]
+        prices = self._prices(inst_id)
+        ts = self.start_ts
+        open_price = next(prices)
+        i = 0
+        while not ws.closed and (self.candles is None or i <= self.candles):
+            close_price = next(prices)
+            row = [
+                str(ts),
+                str(open_price),
+                str(max(open_price, close_price)),
+                str(min(open_price, close_price)),
+                str(close_price),
+                "10",
+                "1000",
+                "1000",
+            ]
+            if i > 0:
+                self.sent_at[(inst_id, timeframe, ts - TIMEFRAME_MS[timeframe])] = time.perf_counter()
+            await ws.send_str(json.dumps({
+                "action": "snapshot" if i == 0 else "update",
+                "arg": arg,
+                "data": [row],
+                "ts": int(time.time() * 1000),
+            }))
+            await asyncio.sleep(self.candle_seconds)
+            open_price = close_price
+            ts += TIMEFRAME_MS[timeframe]
+            i += 1
+
+    async def _push_tickers(self, ws, arg):
+        prices = self._prices(arg["instId"])
+        while not ws.closed:
+            price = next(prices)
+            await ws.send_str(json.dumps({
+                "action": "snapshot",
+                "arg": arg,
+                "data": [{
+                    "instId": arg["instId"],
+                    "lastPr": str(price),
+                    "markPrice": str(price),
+                    "ts": str(int(time.time() * 1000)),
+                }],
+                "ts": int(time.time() * 1000),
+            }))
+            await asyncio.sleep(self.candle_seconds / 2)
+
+
+def standin_markets(pairs) -> dict:
+    """ Minimal ccxt markets of the stand-in pairs, no REST call needed """
+    markets = {}
+    for pair in pairs:
+        base, quote = pair.split("/")
+        markets[f"{pair}:{quote}"] = {
+            "id": f"{base}{quote}",
+            "symbol": f"{pair}:{quote}",
+            "base": base,
+            "quote": quote,
+            "settle": quote,
+            "baseId": base,
+            "quoteId": quote,
+            "settleId": quote,
+            "type": "swap",
+            "spot": False,
+            "swap": True,
+            "future": False,
+            "contract": True,
+            "linear": True,
+            "inverse": False,
+            "contractSize": 1,
+            "precision": {"price": 0.01, "amount": 0.001},
+            "limits": {},
+            "info": {},
+        }
+    return markets
+
+
+async def serve(args):
+    server = StandinServer(args.host, args.port, args.candle_seconds, seed=args.seed)
+    await server.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+async def run(args):
+    server = StandinServer(args.host, args.port, args.candle_seconds, candles=args.candles, seed=args.seed)
+    await server.start()
+    exchange = PerpBitget()
+    exchange._session.set_markets(standin_markets(args.pairs))
+    url = f"ws://{args.host}:{args.port}/ws"
+    delays = []
+    closes = {pair: 0 for pair in args.pairs}
+
+    def on_close(pair, timeframe, candle):
+        sent_at = server.sent_at.get((pair.replace("/", ""), timeframe, candle[0]))
+        if sent_at is not None:
+            delays.append(time.perf_counter() - sent_at)
+        closes[pair] += 1
+        print(f"{pair} {timeframe} closed {candle[0]} close {candle[4]:.4f}")
+
+    try:
+        live = exchange.start_stream(args.pairs, [args.timeframe], ws_urls={"public": url, "private": url})
+        live.on_candle_close(on_close)
+        timeout = args.candle_seconds * (args.candles + 5)
+        start = time.perf_counter()
+        while min(closes.values()) < args.candles and time.perf_counter() - start < timeout:
+            await asyncio.sleep(args.candle_seconds / 4)
+    finally:
+        await exchange.close()
+        await server.close()
+
+    if len(delays) == 0:
+        sys.exit("No candle close received")
+    delays.sort()
+    print(
+        f"{len(delays)} candle closes, delay ms: median {delays[len(delays) // 2] * 1000:.2f}"
+        f", max {delays[-1] * 1000:.2f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("mode", choices=["serve", "run"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--candle-seconds", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pairs", nargs="+", default=["BTC/USDT"])
+    parser.add_argument("--timeframe", default="1h", choices=list(CANDLE_CHANNELS))
+    parser.add_argument("--candles", type=int, default=10, help="candle closes to wait for per pair (run)")
+    args = parser.parse_args()
+    asyncio.run(serve(args) if args.mode == "serve" else run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import copy
 import datetime
 import sys
 import json
@@ -8,6 +9,10 @@ sys.path.append("./Live-Tools-V2")
 
 import asyncio
 from utilities.bitget_perp import PerpBitget
+from utilities.http_transport import close_shared_session
+from utilities.ohlcv_chunks import OhlcvFetchError
+from utilities.state_book import StateBook
+from utilities.tracing import Tracer
 from secret import ACCOUNTS
 import ta
 
@@ -17,12 +22,18 @@ if sys.platform == "win32":
 # Configuration du tracking PnL
 TRACKING_FILE = "strategies/envelopes/bitget_tracking.json"
 CRONLOG_FILE = "cronlog.log"
+# Phase and API call timings, one JSON line per run (use a .prom path for Prometheus)
+METRICS_FILE = "strategies/envelopes/bitget_metrics.jsonl"
+# Last confirmed margin mode / leverage per pair, avoids resetting them every hour
+LEVERAGE_CACHE_FILE = "strategies/envelopes/leverage_cache.json"
+# Accounts of secret.ACCOUNTS traded with the same params, each sized on its own balance
+ACCOUNT_NAMES = ["bitget1"]
 
-def load_tracking_data():
+def load_tracking_data(tracking_file=TRACKING_FILE):
     """Charger les données de tracking PnL global et par crypto"""
-    if os.path.exists(TRACKING_FILE):
+    if os.path.exists(tracking_file):
         try:
-            with open(TRACKING_FILE, 'r') as f:
+            with open(tracking_file, 'r') as f:
                 return json.load(f)
         except:
             pass
@@ -42,10 +53,10 @@ def load_tracking_data():
         "crypto_stats": {}  # Nouveau: stats par crypto
     }
 
-def save_tracking_data(data):
+def save_tracking_data(data, tracking_file=TRACKING_FILE):
     """Sauvegarder les données de tracking PnL"""
-    os.makedirs(os.path.dirname(TRACKING_FILE), exist_ok=True)
-    with open(TRACKING_FILE, 'w') as f:
+    os.makedirs(os.path.dirname(tracking_file), exist_ok=True)
+    with open(tracking_file, 'w') as f:
         json.dump(data, f, indent=2)
 
 def calculate_timeframe_stats(trades, days):
@@ -267,265 +278,37 @@ def update_crypto_performance_stats(tracking_data, positions):
     return tracking_data
 
 
-async def main():
-    account = ACCOUNTS["bitget1"]
-
-    margin_mode = "isolated"  # isolated or crossed
-    leverage = 2
-    hedge_mode = True # Warning, set to False if you are in one way mode
+async def run_account(account_name, params, df_list, settings, tracking_file, data_exchange):
+    """Gestion des ordres d'un compte sur les bougies et indicateurs partagés
 
-    tf = "1h"
-    sl = 0.5
-    params = {
-       "INJ/USDT": {
-            "src": "close",
-            "ma_base_window": 20,
-            "envelopes": [0.077],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-         "XRP/USDT": {
-            "src": "close",
-            "ma_base_window": 12,
-            "envelopes": [0.036],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "PYTH/USDT": {
-            "src": "close",
-            "ma_base_window": 17,
-            "envelopes": [0.07],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "TIA/USDT": {
-            "src": "close",
-            "ma_base_window": 13,
-            "envelopes": [0.059],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "SUI/USDT": {
-            "src": "close",
-            "ma_base_window": 17,
-            "envelopes": [0.05],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "KSM/USDT": {
-            "src": "close",
-            "ma_base_window": 16,
-            "envelopes": [0.06],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "AVAX/USDT": {
-            "src": "close",
-            "ma_base_window": 15,
-            "envelopes": [0.065],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "RENDER/USDT": {
-            "src": "close",
-            "ma_base_window": 16,
-            "envelopes": [0.042],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "VET/USDT": {
-            "src": "close",
-            "ma_base_window": 19,
-            "envelopes": [0.056],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "ALGO/USDT": {
-            "src": "close",
-            "ma_base_window": 17,
-            "envelopes": [0.056],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "DYM/USDT": {
-            "src": "close",
-            "ma_base_window": 14,
-            "envelopes": [0.075],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "ADA/USDT": {
-            "src": "close",
-            "ma_base_window": 15,
-            "envelopes": [0.05],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "GRASS/USDT": {
-            "src": "close",
-            "ma_base_window": 31,
-            "envelopes": [0.14],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-         "NEAR/USDT": {
-            "src": "close",
-            "ma_base_window": 19,
-            "envelopes": [0.037],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "SOL/USDT": {
-            "src": "close",
-            "ma_base_window": 14,
-            "envelopes": [0.05],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "OM/USDT": {
-            "src": "close",
-            "ma_base_window": 16,
-            "envelopes": [0.046],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "PEPE/USDT": {
-            "src": "close",
-            "ma_base_window": 9,
-            "envelopes": [0.062],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "HBAR/USDT": {
-            "src": "close",
-            "ma_base_window": 22,
-            "envelopes": [0.053],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "DOGE/USDT": {
-            "src": "close",
-            "ma_base_window": 14,
-            "envelopes": [0.051],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "DOT/USDT": {
-            "src": "close",
-            "ma_base_window": 30,
-            "envelopes": [0.057],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "KAS/USDT": {
-            "src": "close",
-            "ma_base_window": 22,
-            "envelopes": [0.066],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "GRT/USDT": {
-            "src": "close",
-            "ma_base_window": 19,
-            "envelopes": [0.053],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "TAO/USDT": {
-            "src": "close",
-            "ma_base_window": 22,
-            "envelopes": [0.054],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "ETH/USDT": {
-            "src": "close",
-            "ma_base_window": 20,
-            "envelopes": [0.052],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-        "FIL/USDT": {
-            "src": "close",
-            "ma_base_window": 40,
-            "envelopes": [0.06],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-         "ICP/USDT": {
-            "src": "close",
-            "ma_base_window": 18,
-            "envelopes": [0.061],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-         "HYPE/USDT": {
-            "src": "close",
-            "ma_base_window": 15,
-            "envelopes": [0.069],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-         "ONDO/USDT": {
-            "src": "close",
-            "ma_base_window": 17,
-            "envelopes": [0.051],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-         "SEI/USDT": {
-            "src": "close",
-            "ma_base_window": 13,
-            "envelopes": [0.065],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-         "FET/USDT": {
-            "src": "close",
-            "ma_base_window": 15,
-            "envelopes": [0.056],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-         "TON/USDT": {
-            "src": "close",
-            "ma_base_window": 17,
-            "envelopes": [0.061],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-         "JUP/USDT": {
-            "src": "close",
-            "ma_base_window": 17,
-            "envelopes": [0.083],
-            "size": 0.0312,
-            "sides": ["long"],
-        },
-    }
+    Each account has its own session, so its own ccxt rate limiter
+    (ACCOUNTS[account_name]["rate_limit"] ms between requests, 100 by
+    default). Returns the account summary used by the aggregated report.
+    """
+    account = ACCOUNTS[account_name]
+    margin_mode = settings["margin_mode"]
+    leverage = settings["leverage"]
+    hedge_mode = settings["hedge_mode"]
+    sl = settings["sl"]
+    # canceled order counts are stored per pair and differ between accounts
+    params = copy.deepcopy(params)
+    pairs = list(params.keys())
+    invert_side = {"long": "sell", "short": "buy"}
 
-    exchange = PerpBitget(
+    tracer = Tracer(f"multi_bitget_{account_name}")
+    exchange = tracer.wrap(PerpBitget(
         public_api=account["public_api"],
         secret_api=account["secret_api"],
         password=account["password"],
-    )
-    invert_side = {"long": "sell", "short": "buy"}
-    print(
-        f"--- Execution started at {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---"
-    )
+        leverage_cache_file=LEVERAGE_CACHE_FILE,
+        rate_limit=account.get("rate_limit", 100),
+    ))
+    exchange.share_markets(data_exchange)
     try:
-        await exchange.load_markets()
-
-        for pair in params.copy():
-            info = exchange.get_pair_info(pair)
-            if info is None:
-                print(f"Pair {pair} not found, removing from params...")
-                del params[pair]
-
-        pairs = list(params.keys())
-
+        tracer.begin("leverage")
         try:
             print(
-                f"Setting {margin_mode} x{leverage} on {len(pairs)} pairs..."
+                f"[{account_name}] Setting {margin_mode} x{leverage} on {len(pairs)} pairs..."
             )
             tasks = [
                 exchange.set_margin_mode_and_leverage(
@@ -533,109 +316,73 @@ async def main():
                 )
                 for pair in pairs
             ]
-            await asyncio.gather(*tasks)  # set leverage and margin mode for all pairs
+            infos = await asyncio.gather(*tasks)  # set leverage and margin mode for all pairs
+            for info in infos:
+                if not info.success:
+                    print(info.message)
         except Exception as e:
             print(e)
 
-        print(f"Getting data and indicators on {len(pairs)} pairs...")
-        tasks = [exchange.get_last_ohlcv(pair, tf, 50) for pair in pairs]
-        dfs = await asyncio.gather(*tasks)
-        df_list = dict(zip(pairs, dfs))
+        tracer.begin("balance")
+        usdt_balance = await exchange.get_balance()
+        usdt_balance = usdt_balance.total
+        print(f"[{account_name}] Balance: {round(usdt_balance, 2)} USDT")
+        
+        # Charger les données de tracking
+        tracking_data = load_tracking_data(tracking_file)
 
+        tracer.begin("cancel")
+        # état du compte (positions, ordres et ordres trigger) relevé en REST dans
+        # le book, les décisions du passage sont prises sur le book
+        print(f"[{account_name}] Getting positions and open orders...")
+        book = StateBook()
+        await book.reconcile(exchange, pairs)
+        sides = ["long", "short"]
         for pair in df_list:
-            current_params = params[pair]
-            df = df_list[pair]
-            if current_params["src"] == "close":
-                src = df["close"]
-            elif current_params["src"] == "ohlc4":
-                src = (df["close"] + df["high"] + df["low"] + df["open"]) / 4
-
-            df["ma_base"] = ta.trend.sma_indicator(
-                close=src, window=current_params["ma_base_window"]
-            )
-            high_envelopes = [
-                round(1 / (1 - e) - 1, 3) for e in current_params["envelopes"]
-            ]
-            for i in range(1, len(current_params["envelopes"]) + 1):
-                df[f"ma_high_{i}"] = df["ma_base"] * (1 + high_envelopes[i - 1])
-                df[f"ma_low_{i}"] = df["ma_base"] * (
-                    1 - current_params["envelopes"][i - 1]
-                )
-
-            df_list[pair] = df
-
-        usdt_balance = await exchange.get_balance()
-        usdt_balance = usdt_balance.total
-        print(f"Balance: {round(usdt_balance, 2)} USDT")
-        
-        # Charger les données de tracking
-        tracking_data = load_tracking_data()
+            # ordres d'ouverture (non reduce) par côté de position
+            params[pair]["canceled_orders_buy"] = len(book.open_orders(pair, "long", reduce=False))
+            params[pair]["canceled_orders_sell"] = len(book.open_orders(pair, "short", reduce=False))
 
-        tasks = [exchange.get_open_trigger_orders(pair) for pair in pairs]
-        print(f"Getting open trigger orders...")
-        trigger_orders = await asyncio.gather(*tasks)
-        trigger_order_list = dict(
-            zip(pairs, trigger_orders)
-        )  # Get all open trigger orders by pair
+        def listed_ids(pair, trigger):
+            # sans données, seuls les ordres d'ouverture de la paire sont annulés, la
+            # clôture et le stop loss d'une position restent en place
+            reduce = None if pair in df_list else False
+            return [order.id for side in sides for order in book.open_orders(pair, side, reduce=reduce, trigger=trigger)]
 
-        tasks = []
-        for pair in df_list:
-            params[pair]["canceled_orders_buy"] = len(
-                [
-                    order
-                    for order in trigger_order_list[pair]
-                    if (order.side == "buy" and order.reduce is False)
-                ]
-            )
-            params[pair]["canceled_orders_sell"] = len(
-                [
-                    order
-                    for order in trigger_order_list[pair]
-                    if (order.side == "sell" and order.reduce is False)
-                ]
-            )
-            tasks.append(
-                exchange.cancel_trigger_orders(
-                    pair, [order.id for order in trigger_order_list[pair]]
-                )
-            )
-        print(f"Canceling trigger orders...")
-        await asyncio.gather(*tasks)  # Cancel all trigger orders
+        def cancel_done(results):
+            for result in results:
+                if result.success and book.order(result.id) is not None:
+                    book.update_order(book.order(result.id), False)
+                elif not result.success:
+                    print(f"[{account_name}] Error canceling order {result.id} on {result.pair} => {result.message}")
 
-        tasks = [exchange.get_open_orders(pair) for pair in pairs]
-        print(f"Getting open orders...")
-        orders = await asyncio.gather(*tasks)
-        order_list = dict(zip(pairs, orders))  # Get all open orders by pair
+        # triggers first: a trigger firing meanwhile becomes a limit order, caught
+        # by the reconciliation made after the trigger cancel
+        print(f"[{account_name}] Canceling trigger orders...")
+        cancel_results = await exchange.cancel_orders_by_pair(
+            {pair: listed_ids(pair, True) for pair in pairs},
+            trigger=True,
+        )  # Cancel all trigger orders, one batch per pair
+        cancel_done(cancel_results)
 
-        tasks = []
-        for pair in df_list:
-            params[pair]["canceled_orders_buy"] = params[pair][
-                "canceled_orders_buy"
-            ] + len(
-                [
-                    order
-                    for order in order_list[pair]
-                    if (order.side == "buy" and order.reduce is False)
-                ]
-            )
-            params[pair]["canceled_orders_sell"] = params[pair][
-                "canceled_orders_sell"
-            ] + len(
-                [
-                    order
-                    for order in order_list[pair]
-                    if (order.side == "sell" and order.reduce is False)
-                ]
-            )
-            tasks.append(
-                exchange.cancel_orders(pair, [order.id for order in order_list[pair]])
-            )
-
-        print(f"Canceling limit orders...")
-        await asyncio.gather(*tasks)  # Cancel all orders
+        tracer.begin("positions")
+        print(f"[{account_name}] Reconciling positions and open orders...")
+        for line in await book.reconcile(exchange, pairs):
+            print(f"[{account_name}] Changed since the first listing => {line}")
 
-        print(f"Getting live positions...")
-        positions = await exchange.get_open_positions(pairs)
+        print(f"[{account_name}] Canceling limit orders...")
+        limit_cancel_results = await exchange.cancel_orders_by_pair(
+            {pair: listed_ids(pair, False) for pair in df_list},
+            all_listed=True,
+        )  # Cancel all orders, one batch per pair
+        stale_pairs = [pair for pair in pairs if pair not in df_list]
+        if len(stale_pairs) > 0:
+            limit_cancel_results += await exchange.cancel_orders_by_pair(
+                {pair: listed_ids(pair, False) for pair in stale_pairs},
+            )  # Opening orders only on the pairs without data
+        cancel_done(limit_cancel_results)
+        cancel_results += limit_cancel_results
+        positions = list(book.positions.values())
         
         # Mettre à jour les statistiques de performance globales
         tracking_data = update_performance_stats(tracking_data, usdt_balance, positions)
@@ -646,12 +393,16 @@ async def main():
         # Calculer le PnL total unrealized des positions ouvertes
         total_unrealized_pnl = sum(pos.unrealizedPnl for pos in positions)
         
+        tracer.begin("orders")
         tasks_close = []
         tasks_open = []
         for position in positions:
             print(
-                f"Current position on {position.pair} {position.side} - {position.size} ~ {position.usd_size} $ (PnL: {position.unrealizedPnl})"
+                f"[{account_name}] Current position on {position.pair} {position.side} - {position.size} ~ {position.usd_size} $ (PnL: {position.unrealizedPnl})"
             )
+            if position.pair not in df_list:
+                print(f"[{account_name}] No data on {position.pair}, its close and SL orders are kept")
+                continue
             row = df_list[position.pair].iloc[-2]
             tasks_close.append(
                 exchange.place_order(
@@ -753,13 +504,13 @@ async def main():
                     )
                 )
 
-        print(f"Placing {len(tasks_close)} close SL / limit order...")
-        await asyncio.gather(*tasks_close)  # Limit orders when in positions
+        print(f"[{account_name}] Placing {len(tasks_close)} close SL / limit order...")
+        close_results = await asyncio.gather(*tasks_close)  # Limit orders when in positions
 
         pairs_not_in_position = [
             pair
-            for pair in pairs
-            if pair not in [position.pair for position in positions]
+            for pair in df_list
+            if book.position(pair, "long") is None and book.position(pair, "short") is None
         ]
         for pair in pairs_not_in_position:
             row = df_list[pair].iloc[-2]
@@ -819,11 +570,13 @@ async def main():
                         )
                     )
 
-        print(f"Placing {len(tasks_open)} open limit order...")
-        await asyncio.gather(*tasks_open)  # Limit orders when not in positions
+        print(f"[{account_name}] Placing {len(tasks_open)} open limit order...")
+        open_results = await asyncio.gather(*tasks_open)  # Limit orders when not in positions
 
         # Sauvegarder les données de tracking
-        save_tracking_data(tracking_data)
+        tracer.begin("tracking_save")
+        save_tracking_data(tracking_data, tracking_file)
+        tracer.begin("report")
         
         # Calculer les statistiques par timeframe
         stats_1w = calculate_timeframe_stats(tracking_data["trades"], 7)
@@ -837,7 +590,7 @@ async def main():
         
         # Log des performances dans cronlog.log
         performance_log = f"""
-=== BITGET ENVELOPES STRATEGY PERFORMANCE ===
+=== BITGET ENVELOPES STRATEGY PERFORMANCE ({account_name}) ===
 Execution: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 Balance: {usdt_balance:.2f} USDT
 Unrealized PnL: {total_unrealized_pnl:.2f} USDT
@@ -904,7 +657,7 @@ Total PnL: {total_pnl:.2f} USDT ({pnl_percentage:+.2f}%)
         log_to_cronlog(performance_log)
         
         # Afficher les stats dans la console
-        print(f"\\n🎯 Performance Summary:")
+        print(f"\\n🎯 Performance Summary ({account_name}):")
         print(f"Balance: {usdt_balance:.2f} USDT | Unrealized PnL: {total_unrealized_pnl:+.2f} USDT")
         print(f"All Time: {stats_all['total_trades']} trades, {stats_all['winrate']:.1f}% WR, {stats_all['total_pnl']:+.2f} USDT")
         print(f"Last 30d: {stats_1m['trades']} trades, {stats_1m['winrate']:.1f}% WR, {stats_1m['pnl']:+.2f} USDT")
@@ -930,13 +683,398 @@ Total PnL: {total_pnl:.2f} USDT ({pnl_percentage:+.2f}%)
                         print(f"📉 Worst: {worst_pair} ({worst_data['stats']['total_pnl']:+.2f} USDT, {worst_data['stats']['winrate']:.1f}% WR)")
 
         await exchange.close()
+        tracer.end()
+        print(tracer.summary())
+        tracer.write(METRICS_FILE)
+        return {
+            "account": account_name,
+            "balance": usdt_balance,
+            "unrealized_pnl": total_unrealized_pnl,
+            "positions": len(positions),
+            "orders": len(close_results) + len(open_results),
+            "failed_orders": len([r for r in close_results + open_results if r is None]),
+            "failed_cancels": len([r for r in cancel_results if not r.success]),
+        }
+    except Exception as e:
+        tracer.end(error=True)
+        tracer.write(METRICS_FILE)
+        await exchange.close()
+        raise e
+
+
+def accounts_report(account_names, results):
+    """Rapport agrégé de tous les comptes"""
+    lines = ["=== BITGET ENVELOPES ACCOUNTS ==="]
+    total_balance = 0
+    total_unrealized_pnl = 0
+    for account_name, result in zip(account_names, results):
+        if isinstance(result, Exception):
+            lines.append(f"{account_name}: FAILED => {str(result)}")
+            continue
+        total_balance += result["balance"]
+        total_unrealized_pnl += result["unrealized_pnl"]
+        lines.append(
+            f"{account_name}: {result['balance']:.2f} USDT, PnL {result['unrealized_pnl']:+.2f} USDT, "
+            f"{result['positions']} positions, {result['orders']} orders "
+            f"({result['failed_orders']} failed, {result['failed_cancels']} failed cancels)"
+        )
+    lines.append(f"Total: {total_balance:.2f} USDT, PnL {total_unrealized_pnl:+.2f} USDT")
+    return "\n".join(lines)
+
+
+def account_tracking_file(index, account_name):
+    """Le premier compte garde le fichier de tracking historique"""
+    if index == 0:
+        return TRACKING_FILE
+    return TRACKING_FILE.replace(".json", f"_{account_name}.json")
+
+
+async def main():
+    margin_mode = "isolated"  # isolated or crossed
+    leverage = 2
+    hedge_mode = True # Warning, set to False if you are in one way mode
+
+    tf = "1h"
+    sl = 0.5
+    params = {
+       "INJ/USDT": {
+            "src": "close",
+            "ma_base_window": 20,
+            "envelopes": [0.077],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+         "XRP/USDT": {
+            "src": "close",
+            "ma_base_window": 12,
+            "envelopes": [0.036],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "PYTH/USDT": {
+            "src": "close",
+            "ma_base_window": 17,
+            "envelopes": [0.07],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "TIA/USDT": {
+            "src": "close",
+            "ma_base_window": 13,
+            "envelopes": [0.059],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "SUI/USDT": {
+            "src": "close",
+            "ma_base_window": 17,
+            "envelopes": [0.05],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "KSM/USDT": {
+            "src": "close",
+            "ma_base_window": 16,
+            "envelopes": [0.06],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "AVAX/USDT": {
+            "src": "close",
+            "ma_base_window": 15,
+            "envelopes": [0.065],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "RENDER/USDT": {
+            "src": "close",
+            "ma_base_window": 16,
+            "envelopes": [0.042],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "VET/USDT": {
+            "src": "close",
+            "ma_base_window": 19,
+            "envelopes": [0.056],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "ALGO/USDT": {
+            "src": "close",
+            "ma_base_window": 17,
+            "envelopes": [0.056],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "DYM/USDT": {
+            "src": "close",
+            "ma_base_window": 14,
+            "envelopes": [0.075],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "ADA/USDT": {
+            "src": "close",
+            "ma_base_window": 15,
+            "envelopes": [0.05],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "GRASS/USDT": {
+            "src": "close",
+            "ma_base_window": 31,
+            "envelopes": [0.14],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+         "NEAR/USDT": {
+            "src": "close",
+            "ma_base_window": 19,
+            "envelopes": [0.037],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "SOL/USDT": {
+            "src": "close",
+            "ma_base_window": 14,
+            "envelopes": [0.05],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "OM/USDT": {
+            "src": "close",
+            "ma_base_window": 16,
+            "envelopes": [0.046],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "PEPE/USDT": {
+            "src": "close",
+            "ma_base_window": 9,
+            "envelopes": [0.062],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "HBAR/USDT": {
+            "src": "close",
+            "ma_base_window": 22,
+            "envelopes": [0.053],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "DOGE/USDT": {
+            "src": "close",
+            "ma_base_window": 14,
+            "envelopes": [0.051],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "DOT/USDT": {
+            "src": "close",
+            "ma_base_window": 30,
+            "envelopes": [0.057],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "KAS/USDT": {
+            "src": "close",
+            "ma_base_window": 22,
+            "envelopes": [0.066],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "GRT/USDT": {
+            "src": "close",
+            "ma_base_window": 19,
+            "envelopes": [0.053],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "TAO/USDT": {
+            "src": "close",
+            "ma_base_window": 22,
+            "envelopes": [0.054],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "ETH/USDT": {
+            "src": "close",
+            "ma_base_window": 20,
+            "envelopes": [0.052],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+        "FIL/USDT": {
+            "src": "close",
+            "ma_base_window": 40,
+            "envelopes": [0.06],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+         "ICP/USDT": {
+            "src": "close",
+            "ma_base_window": 18,
+            "envelopes": [0.061],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+         "HYPE/USDT": {
+            "src": "close",
+            "ma_base_window": 15,
+            "envelopes": [0.069],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+         "ONDO/USDT": {
+            "src": "close",
+            "ma_base_window": 17,
+            "envelopes": [0.051],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+         "SEI/USDT": {
+            "src": "close",
+            "ma_base_window": 13,
+            "envelopes": [0.065],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+         "FET/USDT": {
+            "src": "close",
+            "ma_base_window": 15,
+            "envelopes": [0.056],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+         "TON/USDT": {
+            "src": "close",
+            "ma_base_window": 17,
+            "envelopes": [0.061],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+         "JUP/USDT": {
+            "src": "close",
+            "ma_base_window": 17,
+            "envelopes": [0.083],
+            "size": 0.0312,
+            "sides": ["long"],
+        },
+    }
+
+    settings = {
+        "margin_mode": margin_mode,
+        "leverage": leverage,
+        "hedge_mode": hedge_mode,
+        "sl": sl,
+    }
+
+    tracer = Tracer("multi_bitget")
+    # market data is public, loaded once for every account
+    exchange = tracer.wrap(PerpBitget())
+    print(
+        f"--- Execution started at {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---"
+    )
+    try:
+        tracer.begin("load_markets")
+        await exchange.load_markets()
+
+        for pair in params.copy():
+            info = exchange.get_pair_info(pair)
+            if info is None:
+                print(f"Pair {pair} not found, removing from params...")
+                del params[pair]
+
+        pairs = list(params.keys())
+
+        print(f"Getting data and indicators on {len(pairs)} pairs...")
+        tracer.begin("ohlcv")
+        tasks = [exchange.get_last_ohlcv(pair, tf, 50) for pair in pairs]
+        dfs = await asyncio.gather(*tasks, return_exceptions=True)
+        # une seconde tentative ne redemande que les morceaux manquants
+        retry_indexes = [i for i, df in enumerate(dfs) if isinstance(df, OhlcvFetchError)]
+        retried = await asyncio.gather(
+            *[exchange.get_last_ohlcv(pairs[i], tf, 50, resume=dfs[i]) for i in retry_indexes],
+            return_exceptions=True,
+        )
+        for i, df in zip(retry_indexes, retried):
+            dfs[i] = df
+        df_list = {}
+        for pair, df in zip(pairs, dfs):
+            # une paire sans données ne bloque pas les autres, elle reste dans params
+            # pour que run_account annule ses ordres d'ouverture
+            if isinstance(df, Exception):
+                print(f"Data not available for {pair}, no new orders on it... - Error => {str(df)}")
+            else:
+                df_list[pair] = df
+
+        tracer.begin("indicators")
+
+        for pair in df_list:
+            current_params = params[pair]
+            df = df_list[pair]
+            if current_params["src"] == "close":
+                src = df["close"]
+            elif current_params["src"] == "ohlc4":
+                src = (df["close"] + df["high"] + df["low"] + df["open"]) / 4
+
+            df["ma_base"] = ta.trend.sma_indicator(
+                close=src, window=current_params["ma_base_window"]
+            )
+            high_envelopes = [
+                round(1 / (1 - e) - 1, 3) for e in current_params["envelopes"]
+            ]
+            for i in range(1, len(current_params["envelopes"]) + 1):
+                df[f"ma_high_{i}"] = df["ma_base"] * (1 + high_envelopes[i - 1])
+                df[f"ma_low_{i}"] = df["ma_base"] * (
+                    1 - current_params["envelopes"][i - 1]
+                )
+
+            df_list[pair] = df
+
+        tracer.begin("accounts")
+        print(f"Managing orders on {len(ACCOUNT_NAMES)} accounts...")
+        results = await asyncio.gather(
+            *[
+                run_account(
+                    account_name,
+                    params,
+                    df_list,
+                    settings,
+                    account_tracking_file(i, account_name),
+                    exchange,
+                )
+                for i, account_name in enumerate(ACCOUNT_NAMES)
+            ],
+            return_exceptions=True,
+        )  # Every account concurrently, a failing account does not stop the others
+
+        tracer.begin("report")
+        report = accounts_report(ACCOUNT_NAMES, results)
+        print(report)
+        log_to_cronlog(report)
+
+        await exchange.close()
+        tracer.end()
+        print(tracer.summary())
+        tracer.write(METRICS_FILE)
         print(
             f"--- Execution finished at {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---"
         )
     except Exception as e:
+        tracer.end(error=True)
+        tracer.write(METRICS_FILE)
         await exchange.close()
         raise e
+    finally:
+        # connexions partagées par les exchanges des comptes
+        await close_shared_session()
+
+    errors = [result for result in results if isinstance(result, Exception)]
+    if len(errors) > 0:
+        raise errors[0]
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
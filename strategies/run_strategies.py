@@ -0,0 +1,112 @@
+import argparse
+import asyncio
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append("./Live-Tools-V2")
+
+from utilities.markets_cache import MARKETS_DIR_ENV
+from utilities.tracing import Tracer
+
+# Strategies launched every hour, each in its own python process
+STRATEGIES = [
+    "strategies/envelopes/multi_bitget.py",
+    # "strategies/trix/multi_bitmart_lite.py",
+]
+# Every strategy still running this many seconds after the start is stopped
+DEADLINE = 50 * 60
+# Seconds left to a stopped strategy to exit before it is killed
+KILL_GRACE = 10
+METRICS_FILE = "strategies/orchestrator_metrics.jsonl"
+
+
+async def read_output(stream, chunks):
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+
+
+async def run_strategy(script, deadline, tracer, env) -> dict:
+    """ Run one strategy script until it exits or the deadline passes
+
+        Its output is captured and printed in one block once it is done, so
+        the logs of strategies running side by side do not interleave.
+    """
+    start = time.perf_counter()
+    status = "ok"
+    with tracer.phase(script):
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            script,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            env=env,
+        )
+        # read as it comes, to keep the output of a strategy stopped at the deadline
+        chunks = []
+        reader = asyncio.ensure_future(read_output(process.stdout, chunks))
+        try:
+            await asyncio.wait_for(process.wait(), timeout=max(0, deadline - time.time()))
+        except asyncio.TimeoutError:
+            status = "timeout"
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), timeout=KILL_GRACE)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+        await reader
+        output = b"".join(chunks)
+        if status == "ok" and process.returncode != 0:
+            status = "failed"
+
+    print(f"===== {script} ({status}) =====")
+    print(output.decode(errors="replace"), end="", flush=True)
+    return {
+        "script": script,
+        "status": status,
+        "returncode": process.returncode,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run the hourly strategies in parallel")
+    parser.add_argument("scripts", nargs="*", default=STRATEGIES)
+    parser.add_argument("--deadline", type=float, default=DEADLINE, help="seconds")
+    args = parser.parse_args()
+
+    print(
+        f"--- Orchestrator started at {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---"
+    )
+    tracer = Tracer("orchestrator")
+    deadline = time.time() + args.deadline
+    # markets loaded once per exchange for the whole run, see utilities/markets_cache.py
+    with tempfile.TemporaryDirectory(prefix="live_tools_markets_") as markets_dir:
+        env = dict(os.environ, **{MARKETS_DIR_ENV: markets_dir})
+        results = await asyncio.gather(
+            *[run_strategy(script, deadline, tracer, env) for script in args.scripts]
+        )
+
+    print("===== Strategies summary =====")
+    for result in results:
+        print(
+            f"{result['script']}: {result['status']} in {result['seconds']:.1f}s"
+            f" (exit code {result['returncode']})"
+        )
+    print(tracer.summary().splitlines()[0])
+    tracer.write(METRICS_FILE)
+    print(
+        f"--- Orchestrator finished at {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---"
+    )
+    if any(result["status"] != "ok" for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
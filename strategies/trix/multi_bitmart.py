@@ -4,8 +4,12 @@ sys.path.append("./Live-Tools-V2")
 import asyncio
 import datetime
 from utilities.bitmart_perp import PerpBitmart
+from utilities.http_transport import close_shared_session
 from utilities.custom_indicators import Trix
+from utilities.multi_timeframe import MultiTimeframeData
+from utilities.order_execution import execute_orders, net_order_requests, allocate_fill
 from utilities.discord_logger import DiscordLogger
+from utilities.tracing import Tracer
 from secret import ACCOUNTS
 import ta
 import math
@@ -17,6 +21,7 @@ LEVERAGE = 1.5
 ACCOUNT_NAME = "bitmart1"
 SIDE = ["long"]
 DISCORD_WEBHOOK = ""
+MAX_CONCURRENT_ORDERS = 5
 PARAMS = {
     "1h": {
         "p1": {
@@ -159,11 +164,13 @@ async def main():
     exchange_leverage = math.ceil(leverage)
     params = PARAMS
     dl = DiscordLogger(DISCORD_WEBHOOK)
-    exchange = PerpBitmart(
+    tracer = Tracer("multi_bitmart")
+    exchange = tracer.wrap(PerpBitmart(
         public_api=account["public_api"],
         secret_api=account["secret_api"],
         uid=account["memo"],
-    )
+        leverage_cache_file=f"{RELATIVE_PATH}/leverage_cache.json",
+    ))
     print(f"--- Execution started at {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---")
     # Read json position file, if not exist, create it
     try:
@@ -176,6 +183,7 @@ async def main():
 
 
     try:
+        tracer.begin("load_markets")
         await exchange.load_markets()
 
         pair_list = []
@@ -199,27 +207,26 @@ async def main():
                 pair_list.remove(key_param_object["pair"])
         
         print(f"Getting data and indicators on {len(pair_list)} pairs...")
-        tasks = []
-        keys = []
-        tf_pair_loaded = []
+        pair_tf_list = []
         for key_param in key_params.keys():
             key_param_object = key_params[key_param]
             # Check if param have a size
             if "size" not in key_param_object.keys():
                 key_param_object["size"] = 1/len(key_params)
-            if f"{key_param_object["pair"]}-{key_param_object["tf"]}" not in tf_pair_loaded:
-                tf_pair_loaded.append(f"{key_param_object["pair"]}-{key_param_object["tf"]}")
-                keys.append(f"{key_param_object["pair"]}-{key_param_object["tf"]}")
+            pair_tf_list.append((key_param_object["pair"], key_param_object["tf"]))
 
-                tasks.append(exchange.get_last_ohlcv(key_param_object["pair"], key_param_object["tf"], 600))
-
-        dfs = await asyncio.gather(*tasks)
-        df_data = dict(zip(keys, dfs))
+        # 2h and 4h candles are resampled from 1h instead of being fetched again,
+        # 600 of them too (coarse_limit) as the 500 candle long MA needs them
+        tracer.begin("ohlcv")
+        ohlcv_data = MultiTimeframeData(exchange, limit=600)
+        await ohlcv_data.load(pair_tf_list)
         df_list = {}
 
+        tracer.begin("indicators")
+
         for key_param in key_params.keys():
             key_param_object = key_params[key_param]
-            df = df_data[f"{key_param_object["pair"]}-{key_param_object["tf"]}"]
+            df = ohlcv_data.get(key_param_object["pair"], key_param_object["tf"])
 
             trix_obj = Trix(
                 close=df["close"],
@@ -240,6 +247,7 @@ async def main():
         # print(df_list)
         # print(key_params)
 
+        tracer.begin("positions")
         usdt_balance = await exchange.get_balance()
         usdt_balance = usdt_balance.total
         dl.log(f"Balance: {round(usdt_balance, 2)} USDT")
@@ -253,6 +261,7 @@ async def main():
         for position in positions:
             dl.log(f"{(position.side).upper()} {position.size} {position.pair} ~{position.usd_size}$ (+ {position.unrealizedPnl}$)")
 
+        tracer.begin("leverage")
         try:
             print(f"Setting {margin_mode} x{exchange_leverage} on {len(pair_list)} pairs...")
             tasks = [
@@ -266,9 +275,10 @@ async def main():
             print("error:",e)
 
         # --- Close positions ---
-        key_positions_copy = copy.deepcopy(key_positions)
-        for key_position in key_positions_copy:
-            position_object = key_positions_copy[key_position]
+        tracer.begin("orders")
+        order_requests = []
+        for key_position in key_positions:
+            position_object = key_positions[key_position]
             param_object = key_params[key_position]
             df = df_list[key_position]
             exchange_positions = [p for p in positions if (p.pair == param_object["pair"] and p.side == position_object["side"])]
@@ -278,121 +288,130 @@ async def main():
             exchange_position_size = sum([p.size for p in exchange_positions])
             row = df.iloc[-2]
             
-            if position_object["side"] == "long":
-                if row["trix_hist"] < 0:
-                    close_size = min(position_object["size"], exchange_position_size)
-                    try:
-                        order = await exchange.place_order(
-                            pair=param_object["pair"],
-                            side="sell",
-                            price=None,
-                            size=close_size,
-                            type="market",
-                            reduce=True,
-                            margin_mode=margin_mode,
-                            leverage=math.ceil(leverage),
-                            error=True,
-                        )
-                        if order is not None:
-                            del key_positions[key_position]
-                            dl.log(f"{key_position} Closed {order.size} {param_object['pair']} long")
-                    except Exception as e:
-                        await dl.send_now(f"{key_position} Error closing {param_object['pair']} long: {e}", level="ERROR")
-                        continue
-            elif position_object["side"] == "short":
-                if row["trix_hist"] > 0:
-                    close_size = min(position_object["size"], exchange_position_size)
-                    try:
-                        order = await exchange.place_order(
-                            pair=param_object["pair"],
-                            side="buy",
-                            price=None,
-                            size=close_size,
-                            type="market",
-                            reduce=True,
-                            margin_mode=margin_mode,
-                            leverage=math.ceil(leverage),
-                            error=True,
-                        )
-                        if order is not None:
-                            del key_positions[key_position]
-                            dl.log(f"{key_position} Closed {order.size} {param_object['pair']} short")
-                    except Exception as e:
-                        await dl.send_now(f"{key_position} Error closing {param_object['pair']} short: {e}", level="ERROR")
-                        continue
+            if (position_object["side"] == "long" and row["trix_hist"] < 0) or (
+                position_object["side"] == "short" and row["trix_hist"] > 0
+            ):
+                close_size = min(position_object["size"], exchange_position_size)
+                order_requests.append({
+                    "key": key_position,
+                    "pair": param_object["pair"],
+                    "side": position_object["side"],
+                    "max_reduce": exchange_position_size,
+                    "params": {
+                        "pair": param_object["pair"],
+                        "side": "sell" if position_object["side"] == "long" else "buy",
+                        "price": None,
+                        "size": close_size,
+                        "type": "market",
+                        "reduce": True,
+                        "margin_mode": margin_mode,
+                        "leverage": math.ceil(leverage),
+                        "error": True,
+                    },
+                })
 
         # --- Open positions ---
+        closing_keys = [request["key"] for request in order_requests]
         for key_param in key_params.keys():
-            if key_param in key_positions.keys():
+            if key_param in key_positions.keys() and key_param not in closing_keys:
                 continue
             param_object = key_params[key_param]
             df = df_list[key_param]
             row = df.iloc[-2]
             last_price = df["close"].iloc[-1]
             if row["trix_hist"] > 0 and row["close"] > row["long_ma"] and "long" in SIDE:
-                open_size = (usdt_balance * param_object["size"]) / last_price * leverage
-                try:
-                    order = await exchange.place_order(
-                        pair=param_object["pair"],
-                        side="buy",
-                        price=None,
-                        size=open_size,
-                        type="market",
-                        reduce=False,
-                        margin_mode=margin_mode,
-                        leverage=math.ceil(leverage),
-                        error=True,
-                    )
-                    if order is not None:
-                        key_positions[key_param] = {
-                            "side": "long",
-                            "size": open_size,
-                            "open_price": order.price,
-                            "open_time": order.timestamp,
-                        }
-                        dl.log(f"{key_param} Opened {order.size} {param_object['pair']} long")
-                except Exception as e:
-                    await dl.send_now(f"{key_param} Error opening {param_object['pair']} long: {e}", level="ERROR")
-                    continue
+                open_side = "long"
             elif row["trix_hist"] < 0 and row["close"] < row["long_ma"] and "short" in SIDE:
-                open_size = (usdt_balance * param_object["size"]) / last_price * leverage
-                try:
-                    order = await exchange.place_order(
-                        pair=param_object["pair"],
-                        side="sell",
-                        price=None,
-                        size=open_size,
-                        type="market",
-                        reduce=False,
-                        margin_mode=margin_mode,
-                        leverage=math.ceil(leverage),
-                        error=True,
-                    )
-                    if order is not None:
-                        key_positions[key_param] = {
-                            "side": "short",
-                            "size": open_size,
-                            "open_price": order.price,
-                            "open_time": order.timestamp,
-                        }
-                        dl.log(f"{key_param} Opened {order.size} {param_object['pair']} short")
-                except Exception as e:
-                    await dl.send_now(f"{key_param} Error opening {param_object['pair']} short: {e}", level="ERROR")
+                open_side = "short"
+            else:
+                continue
+            open_size = (usdt_balance * param_object["size"]) / last_price * leverage
+            order_requests.append({
+                "key": key_param,
+                "pair": param_object["pair"],
+                "side": open_side,
+                "last_price": last_price,
+                "params": {
+                    "pair": param_object["pair"],
+                    "side": "buy" if open_side == "long" else "sell",
+                    "price": None,
+                    "size": open_size,
+                    "type": "market",
+                    "reduce": False,
+                    "margin_mode": margin_mode,
+                    "leverage": math.ceil(leverage),
+                    "error": True,
+                },
+            })
+
+        # --- Net orders per pair, closes before opens on each pair ---
+        net_requests = net_order_requests(order_requests)
+        print(f"Placing {len([r for r in net_requests if r['params']['size'] > 0])} net orders for {len(order_requests)} key orders...")
+        net_results = await execute_orders(exchange, net_requests, MAX_CONCURRENT_ORDERS)
+        for net_request, order in zip(net_requests, net_results):
+            pair = net_request["pair"]
+            side = net_request["side"]
+            filled = 0
+            for request in net_request.get("dropped", []):
+                # the close of this key failed, it keeps its position
+                dl.log(f"{request['key']} Skipped opening {pair} {side}, its close failed")
+            if isinstance(order, Exception):
+                keys = ", ".join(m["key"] for m in net_request["members"])
+                await dl.send_now(f"{keys} Error sending net {net_request['params']['side']} {pair} {side}: {order}", level="ERROR")
+            elif order is not None:
+                # market orders are filled whole, order.size only differs by contract rounding
+                filled = net_request["params"]["size"]
+                dl.log(f"{pair} Net {order.side} {order.size} {side} for {len(net_request['members'])} keys")
+            open_price = order.price if order is not None and not isinstance(order, Exception) else None
+            # with nothing filled on the exchange, the sizes allocated were matched
+            # between the keys of the pair
+            matched = " (matched internally)" if filled == 0 else ""
+            for request, size in allocate_fill(net_request, filled):
+                key = request["key"]
+                if isinstance(order, Exception) and size < request["params"]["size"]:
+                    action = "close" if request["params"]["reduce"] else "open"
+                    dl.log(f"{key} Failed to {action} {request['params']['size'] - size} {pair} {side}, the net order failed")
+                if size <= 0:
                     continue
+                if request["params"]["reduce"]:
+                    # the key may already hold the position it reopened on the other side
+                    if key in key_positions and key_positions[key]["side"] == side:
+                        if size >= request["params"]["size"]:
+                            del key_positions[key]
+                        else:
+                            key_positions[key]["size"] -= size
+                    dl.log(f"{key} Closed {size} {pair} {side}{matched}")
+                else:
+                    key_positions[key] = {
+                        "side": side,
+                        "size": size,
+                        "open_price": open_price if open_price is not None else request["last_price"],
+                        "open_time": order.timestamp if open_price is not None else int(datetime.datetime.now().timestamp() * 1000),
+                    }
+                    dl.log(f"{key} Opened {size} {pair} {side}{matched}")
 
         # --- Save positions ---
+        tracer.begin("tracking_save")
         with open(f"{RELATIVE_PATH}/positions_{ACCOUNT_NAME}.json", "w") as f:
             json.dump(key_positions, f)
             
 
         await exchange.close()
+        tracer.end()
+        print(tracer.summary())
+        tracer.write(f"{RELATIVE_PATH}/metrics_{ACCOUNT_NAME}.jsonl")
         print(f"--- Execution finished at {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---")
 
         await dl.send_discord_message(level="INFO")
 
     except Exception as e:
+        tracer.end(error=True)
+        tracer.write(f"{RELATIVE_PATH}/metrics_{ACCOUNT_NAME}.jsonl")
         await exchange.close()
         raise e
+    finally:
+        # connections shared by the exchange and the Discord logger
+        await close_shared_session()
 
 
 if __name__ == "__main__":
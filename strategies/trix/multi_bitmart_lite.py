@@ -4,6 +4,7 @@ sys.path.append("./Live-Tools-V2")
 import asyncio
 import datetime
 from utilities.bitmart_perp import PerpBitmart
+from utilities.http_transport import close_shared_session
 from utilities.custom_indicators import Trix
 from utilities.discord_logger import DiscordLogger
 from secret import ACCOUNTS
@@ -315,6 +316,9 @@ async def main():
     except Exception as e:
         await exchange.close()
         raise e
+    finally:
+        # connections shared by the exchange and the Discord logger
+        await close_shared_session()
 
 
 if __name__ == "__main__":
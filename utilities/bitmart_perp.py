@@ -1,25 +1,38 @@
-from typing import List
+from typing import Dict, List
 import ccxt.async_support as ccxt
+import ccxt.pro as ccxtpro
 import asyncio
+import itertools
 import pandas as pd
 import time
-import itertools
-from pydantic import BaseModel
+from dataclasses import dataclass
 from decimal import Decimal, getcontext
-
-
-class UsdtBalance(BaseModel):
+from utilities.http_transport import shared_session_config
+from utilities.leverage_cache import LeverageCache
+from utilities.markets_cache import load_markets_shared
+from utilities.multi_timeframe import TIMEFRAME_MS
+from utilities.ohlcv_chunks import fetch_ohlcv_chunks, ohlcv_chunks
+from utilities.precision import PrecisionTable
+from utilities.live_stream import ExchangeStream, LiveView
+from utilities.recorder import attach_from_env
+from utilities.single_flight import READ_MEMO_TTL, SingleFlight, invalidates, single_flight
+
+
+@dataclass(slots=True)
+class UsdtBalance:
     total: float
     free: float
     used: float
 
 
-class Info(BaseModel):
+@dataclass(slots=True)
+class Info:
     success: bool
     message: str
 
 
-class Order(BaseModel):
+@dataclass(slots=True)
+class Order:
     id: str
     pair: str
     type: str
@@ -32,7 +45,8 @@ class Order(BaseModel):
     timestamp: int
 
 
-class TriggerOrder(BaseModel):
+@dataclass(slots=True)
+class TriggerOrder:
     id: str
     pair: str
     type: str
@@ -44,7 +58,16 @@ class TriggerOrder(BaseModel):
     timestamp: int
 
 
-class Position(BaseModel):
+@dataclass(slots=True)
+class CancelResult:
+    id: str
+    pair: str
+    success: bool
+    message: str
+
+
+@dataclass(slots=True)
+class Position:
     pair: str
     side: str
     size: float
@@ -62,7 +85,7 @@ class Position(BaseModel):
 
 
 class PerpBitmart:
-    def __init__(self, public_api=None, secret_api=None, uid=None):
+    def __init__(self, public_api=None, secret_api=None, uid=None, leverage_cache_file=None):
         bitmart_auth_object = {
             "apiKey": public_api,
             "secret": secret_api,
@@ -75,15 +98,50 @@ class PerpBitmart:
         getcontext().prec = 10
         if bitmart_auth_object["secret"] == None:
             self._auth = False
-            self._session = ccxt.bitmart()
+            self._session = ccxt.bitmart(shared_session_config())
         else:
             self._auth = True
-            self._session = ccxt.bitmart(bitmart_auth_object)
+            self._session = ccxt.bitmart(shared_session_config(bitmart_auth_object))
+        attach_from_env(self._session)
+        self._flight = SingleFlight()
+        self._stream = None
+        self.live = None
+        self._leverage_cache = None
+        if leverage_cache_file is not None:
+            self._leverage_cache = LeverageCache(leverage_cache_file, public_api)
 
     async def load_markets(self):
-        self.market = await self._session.load_markets()
+        self.market = await load_markets_shared(self._session)
+        self.precision = PrecisionTable.from_markets(
+            {symbol: market for symbol, market in self.market.items() if symbol.endswith(":USDT")},
+            self.pair_to_ext_pair,
+        )
+
+    def start_stream(self, pairs, timeframes=[], tickers=True, ws_urls=None) -> LiveView:
+        """ Subscribe to the candles (one subscription per timeframe) and
+            tickers of pairs over WebSocket. Returns the LiveView kept up to
+            date, also in self.live. Markets must be loaded first. Positions
+            and orders are not streamed on Bitmart.
+
+            Args:
+                ws_urls(dict): replaces urls["api"]["ws"] of the ccxt pro
+                    session, e.g. a local server in tests
+        """
+        ws_session = ccxtpro.bitmart()
+        ws_session.set_markets(self._session.markets, self._session.currencies)
+        if ws_urls is not None:
+            ws_session.urls["api"]["ws"] = ws_urls
+        self.live = LiveView()
+        self._stream = ExchangeStream(ws_session, self.live, self.pair_to_ext_pair)
+        self._stream.start(
+            [self.ext_pair_to_pair(pair) for pair in pairs], timeframes, tickers=tickers
+        )
+        return self.live
 
     async def close(self):
+        if self._stream is not None:
+            await self._stream.close()
+            self._stream = None
         await self._session.close()
 
     def ext_pair_to_pair(self, ext_pair) -> str:
@@ -109,62 +167,60 @@ class PerpBitmart:
     #         return 0
 
     def price_to_precision(self, pair: str, price: float) -> float:
-        pair = self.ext_pair_to_pair(pair)
-        return self._session.price_to_precision(pair, price)
+        """ Also takes a list of pairs and an array of prices """
+        return self.precision.price_to_precision(pair, price)
+
+    @single_flight(ttl=READ_MEMO_TTL, copy_result=True)
+    async def get_last_ohlcv(self, pair, timeframe, limit=1000, resume=None) -> pd.DataFrame:
+        """ Requested in chunks of 500 candles, see fetch_ohlcv_chunks
 
-    async def get_last_ohlcv(self, pair, timeframe, limit=1000) -> pd.DataFrame:
+            resume: OhlcvFetchError of a previous call on the same pair,
+                timeframe and limit, only its missing chunks are requested
+                (the candles then end at the time of that call)
+        """
         pair = self.ext_pair_to_pair(pair)
         bitmart_limit = 500
-        ts_dict = {
-            "1m": 1 * 60 * 1000,
-            "5m": 5 * 60 * 1000,
-            "15m": 15 * 60 * 1000,
-            "1h": 60 * 60 * 1000,
-            "2h": 2 * 60 * 60 * 1000,
-            "4h": 4 * 60 * 60 * 1000,
-            "1d": 24 * 60 * 60 * 1000,
-        }
         end_ts = int(time.time() * 1000)
-        start_ts = end_ts - ((limit) * ts_dict[timeframe])
-        current_ts = start_ts
-        tasks = []
-        while current_ts < end_ts:
-            req_end_ts = min(current_ts + (bitmart_limit * ts_dict[timeframe]), end_ts)
-            tasks.append(
-                self._session.fetch_ohlcv(
-                    pair,
-                    timeframe,
-                    params={
-                        "start_time": str(int(current_ts / 1000)),
-                        "end_time": str(int(req_end_ts / 1000)),
-                    },
-                )
+        start_ts = end_ts - ((limit) * TIMEFRAME_MS[timeframe])
+
+        async def fetch_chunk(start, end):
+            return await self._session.fetch_ohlcv(
+                pair,
+                timeframe,
+                params={
+                    "start_time": str(int(start / 1000)),
+                    "end_time": str(int(end / 1000)),
+                },
             )
-            current_ts += (bitmart_limit * ts_dict[timeframe]) + 1
-        ohlcv_unpack = await asyncio.gather(*tasks)
-        ohlcv_list = list(itertools.chain.from_iterable(ohlcv_unpack))
-        df = pd.DataFrame(
-            ohlcv_list, columns=["date", "open", "high", "low", "close", "volume"]
+
+        if resume is not None:
+            return await fetch_ohlcv_chunks(fetch_chunk, resume.chunks, fetched=resume.fetched)
+        return await fetch_ohlcv_chunks(
+            fetch_chunk,
+            ohlcv_chunks(start_ts, end_ts, bitmart_limit * TIMEFRAME_MS[timeframe]),
         )
-        df = df.set_index(df["date"])
-        df.index = pd.to_datetime(df.index, unit="ms")
-        df = df.sort_index()
-        del df["date"]
-        return df
 
+    @single_flight(ttl=READ_MEMO_TTL, copy_result=True)
     async def get_balance(self) -> UsdtBalance:
         resp = await self._session.fetch_balance(params={"defaultType": "swap"})
         resp_data = resp["info"]["data"]
         usdt_data = [r for r in resp_data if r["currency"] == "USDT"][0]
         return UsdtBalance(
-            total=usdt_data["equity"],
-            free=usdt_data["available_balance"],
-            used=usdt_data["position_deposit"],
+            total=float(usdt_data["equity"]),
+            free=float(usdt_data["available_balance"]),
+            used=float(usdt_data["position_deposit"]),
         )
 
+    @invalidates
     async def set_margin_mode_and_leverage(self, pair, margin_mode, leverage):
         if margin_mode not in ["cross", "isolated"]:
             raise Exception("Margin mode must be either 'cross' or 'isolated'")
+        ext_pair = pair
+        if self._leverage_cache is not None and self._leverage_cache.is_set(ext_pair, margin_mode, leverage):
+            return Info(
+                success=True,
+                message=f"Margin mode and leverage already {margin_mode} and {leverage}x",
+            )
         pair = self.ext_pair_to_pair(pair)
         try:
             await self._session.set_leverage(
@@ -176,13 +232,19 @@ class PerpBitmart:
                 },
             )
         except Exception as e:
+            if self._leverage_cache is not None:
+                self._leverage_cache.invalidate(ext_pair)
             raise e
 
+        if self._leverage_cache is not None:
+            self._leverage_cache.confirm(ext_pair, margin_mode, leverage)
+
         return Info(
             success=True,
             message=f"Margin mode and leverage set to {margin_mode} and {leverage}x",
         )
 
+    @single_flight(ttl=READ_MEMO_TTL, copy_result=True)
     async def get_open_positions(self, pairs) -> List[Position]:
         pairs = [self.ext_pair_to_pair(pair) for pair in pairs]
         resp = await self._session.fetch_positions(symbols=pairs)
@@ -201,34 +263,31 @@ class PerpBitmart:
             if position["hedged"]:
                 hedge_mode = True
 
+            size = Decimal(position["contracts"]) * Decimal(position["contractSize"])
             return_positions.append(
                 Position(
                     pair=self.pair_to_ext_pair(position["symbol"]),
                     side=position["side"],
-                    size=Decimal(position["contracts"])
-                    * Decimal(position["contractSize"]),
+                    size=float(size),
                     usd_size=round(
                         position["markPrice"],
                         2,
                     ),
                     entry_price=position["entryPrice"],
-                    current_price=Decimal(position["markPrice"])
-                    / (
-                        Decimal(position["contracts"])
-                        * Decimal(position["contractSize"])
-                    ),
+                    current_price=float(Decimal(position["markPrice"]) / size),
                     unrealizedPnl=position["unrealizedPnl"],
                     liquidation_price=liquidation_price,
                     leverage=position["leverage"],
                     margin_mode=position["info"]["margin_type"],
                     hedge_mode=hedge_mode,
-                    open_timestamp=position["info"]["open_timestamp"],
+                    open_timestamp=int(position["info"]["open_timestamp"]),
                     take_profit_price=take_profit_price,
                     stop_loss_price=stop_loss_price,
                 )
             )
         return return_positions
 
+    @invalidates
     async def place_order(
         self,
         pair,
@@ -243,14 +302,15 @@ class PerpBitmart:
     ) -> Order:
         try:
             contract_size = (self.get_pair_info(pair))["contractSize"]
-            pair = self.ext_pair_to_pair(pair)
             size = Decimal(size) / Decimal(contract_size)
+            size = self.precision.amount_to_precision(pair, float(size))
+            pair = self.ext_pair_to_pair(pair)
             # trade_side = "Open" if reduce is False else "Close"
             resp = await self._session.create_order(
                 symbol=pair,
                 type=type,
                 side=side,
-                amount=self._session.amount_to_precision(pair, size),
+                amount=size,
                 price=price,
                 params={
                     "reduceOnly": reduce,
@@ -351,6 +411,7 @@ class PerpBitmart:
     #         )
     #     return return_orders
 
+    @single_flight(copy_result=True)
     async def get_order_by_id(self, order_id, pair) -> Order:
         contract_size = (self.get_pair_info(pair))["contractSize"]
         pair = self.ext_pair_to_pair(pair)
@@ -364,13 +425,14 @@ class PerpBitmart:
             type=resp["type"],
             side=resp["side"],
             price=resp["price"],
-            size=Decimal(resp["amount"]) * Decimal(contract_size),
+            size=float(Decimal(resp["amount"]) * Decimal(contract_size)),
             reduce=reduce,
-            filled=Decimal(resp["filled"]) * Decimal(contract_size),
-            remaining=Decimal(resp["remaining"]) * Decimal(contract_size),
+            filled=float(Decimal(resp["filled"]) * Decimal(contract_size)),
+            remaining=float(Decimal(resp["remaining"]) * Decimal(contract_size)),
             timestamp=resp["timestamp"],
         )
 
+    @invalidates
     async def cancel_orders(self, pair, ids=[]):
         try:
             pair = self.ext_pair_to_pair(pair)
@@ -382,6 +444,7 @@ class PerpBitmart:
         except Exception as e:
             return Info(success=False, message="Error or no orders to cancel")
 
+    @invalidates
     async def cancel_trigger_orders(self, pair, ids=[]):
         try:
             pair = self.ext_pair_to_pair(pair)
@@ -390,4 +453,57 @@ class PerpBitmart:
             )
             return Info(success=True, message=f"{len(resp)} Trigger Orders cancelled")
         except Exception as e:
-            return Info(success=False, message="Error or no orders to cancel")
\ No newline at end of file
+            return Info(success=False, message="Error or no orders to cancel")
+
+    async def _cancel_one(self, pair, order_id, trigger) -> List[CancelResult]:
+        try:
+            await self._session.cancel_order(
+                order_id, self.ext_pair_to_pair(pair), params={"stop": True} if trigger else {}
+            )
+            return [CancelResult(id=order_id, pair=pair, success=True, message="Cancelled")]
+        except Exception as e:
+            return [CancelResult(id=order_id, pair=pair, success=False, message=str(e))]
+
+    async def _cancel_pair(self, pair, ids) -> List[CancelResult]:
+        try:
+            market_id = self._session.market(self.ext_pair_to_pair(pair))["id"]
+            await self._session.privatePostContractPrivateCancelOrders({"symbol": market_id})
+            return [
+                CancelResult(id=order_id, pair=pair, success=True, message="Cancelled")
+                for order_id in ids
+            ]
+        except Exception as e:
+            return [
+                CancelResult(id=order_id, pair=pair, success=False, message=str(e))
+                for order_id in ids
+            ]
+
+    @invalidates
+    async def cancel_orders_by_pair(
+        self, ids_by_pair: Dict[str, List[str]], trigger=False, all_listed=False
+    ) -> List[CancelResult]:
+        """ Cancel the listed orders of several pairs at once
+
+            The futures API has no batch cancel by id. With all_listed=True
+            (the ids are every open limit order of their pair, e.g. straight
+            from get_all_open_orders) each pair is cleared with its
+            cancel-orders (cancel all) endpoint, one request per pair.
+            Otherwise, and for trigger orders which have no cancel all by
+            symbol, every order is cancelled by its own request (plan order
+            endpoint when trigger), so only the listed ids are cancelled.
+            Requests are sent concurrently within the rate limit, pairs
+            without ids are skipped.
+
+            Returns:
+                List[CancelResult]: the outcome of every listed order
+        """
+        tasks = []
+        for pair, ids in ids_by_pair.items():
+            if len(ids) == 0:
+                continue
+            if all_listed and not trigger:
+                tasks.append(self._cancel_pair(pair, ids))
+            else:
+                tasks += [self._cancel_one(pair, order_id, trigger) for order_id in ids]
+        results = await asyncio.gather(*tasks)
+        return list(itertools.chain.from_iterable(results))
@@ -6,33 +6,163 @@ import math
 import requests
 
 def get_n_columns(df, columns, n=1):
-    dt = df.copy()
+    """ Copy of df with the columns shifted by n, see lag_name for the names
+
+        Numeric columns go through lag_frame (one preallocated block and one
+        concat), other columns (strings, objects, booleans) are shifted one
+        by one. Lag columns already in df are replaced, not duplicated.
+    """
+    numeric = [
+        col for col in columns
+        if pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])
+    ]
+    lags = lag_frame(df, numeric, [n])
+    dt = pd.concat([df.drop(columns=lags.columns.intersection(df.columns)), lags], axis=1)
     for col in columns:
-        dt["n"+str(n)+"_"+col] = dt[col].shift(n)
+        if col not in numeric:
+            dt[lag_name(col, n)] = df[col].shift(n)
+    # same column order as shifting the columns one by one
+    order = list(df.columns) + [name for name in dict.fromkeys(lag_name(col, n) for col in columns) if name not in df.columns]
+    if list(dt.columns) != order:
+        dt = dt[order]
     return dt
 
+def lag_name(col, lag) -> str:
+    """ "n{lag}_{col}" for a lag, "lead{-lag}_{col}" for a negative one """
+    if lag < 0:
+        return "lead" + str(-lag) + "_" + col
+    return "n" + str(lag) + "_" + col
+
+def lag_matrix(df, columns, lags=(1,)):
+    """ Lagged copies of several columns built in one preallocated array
+
+        Args:
+            df(pd.DataFrame): source frame, only `columns` are read
+            columns(list): numeric columns to lag
+            lags(list): shifts to apply, negative values give leads
+
+        Returns:
+            (np.ndarray, list): n_bars x (len(lags) * len(columns)) float64
+            matrix and its column names (lag_name)
+    """
+    values = df[list(columns)].to_numpy(dtype=np.float64)
+    n, k = values.shape
+    matrix = np.full((n, len(lags) * k), np.nan)
+    names = []
+    for j, lag in enumerate(lags):
+        block = matrix[:, j * k:(j + 1) * k]
+        if abs(lag) < n:
+            if lag >= 0:
+                block[lag:] = values[:n - lag]
+            else:
+                block[:n + lag] = values[-lag:]
+        names += [lag_name(col, lag) for col in columns]
+    return matrix, names
+
+def lag_frame(df, columns, lags=(1,)) -> pd.DataFrame:
+    """ lag_matrix wrapped in a DataFrame sharing its memory """
+    matrix, names = lag_matrix(df, columns, lags)
+    return pd.DataFrame(matrix, index=df.index, columns=names, copy=False)
+
 def rma(input_data: pd.Series, period: int) -> pd.Series:
     data = input_data.copy()
     alpha = 1 / period
     rma = data.ewm(alpha=alpha, adjust=False).mean()
     return rma
 
+def stack_pairs(df_list, column="close") -> pd.DataFrame:
+    """ Align one column of several OHLCV frames into a bars x pairs frame,
+        ready for the batch mode of the array based indicators.
+    """
+    return pd.concat({pair: df[column] for pair, df in df_list.items()}, axis=1)
+
+def _values(data) -> np.ndarray:
+    return np.asarray(data, dtype=np.float64)
+
+def _wrap_like(like, values, name=None):
+    if isinstance(like, pd.DataFrame):
+        return pd.DataFrame(values, index=like.index, columns=like.columns)
+    return pd.Series(values, index=getattr(like, "index", None), name=name)
+
+def _frame(values):
+    # pandas' cython ewm / rolling kernels run column-wise on 2-D input,
+    # which is what makes the multi-pair batch mode a single call
+    return pd.DataFrame(values) if values.ndim == 2 else pd.Series(values)
+
+def _ema_values(values: np.ndarray, window: int) -> np.ndarray:
+    """ Same result as ta.trend.ema_indicator, on 1-D or 2-D arrays """
+    return _frame(values).ewm(span=window, min_periods=window, adjust=False).mean().to_numpy()
+
+def _sma_values(values: np.ndarray, window: int) -> np.ndarray:
+    """ Same result as ta.trend.sma_indicator, on 1-D or 2-D arrays """
+    return _frame(values).rolling(window=window, min_periods=window).mean().to_numpy()
+
+def _rolling_extreme(values: np.ndarray, window: int, ufunc) -> np.ndarray:
+    # van Herk / Gil-Werman: block prefix and suffix running extremes give
+    # any window in two lookups, O(n) like a monotonic deque but vectorized.
+    # Any NaN in the window yields NaN, same as pandas with min_periods=window.
+    values = _values(values)
+    n = values.shape[0]
+    out = np.full(values.shape, np.nan)
+    if window < 1 or n < window:
+        return out
+    blocks = -(-n // window)
+    padded = np.full((blocks * window,) + values.shape[1:], np.nan)
+    padded[:n] = values
+    padded = padded.reshape((blocks, window) + values.shape[1:])
+    prefix = ufunc.accumulate(padded, axis=1).reshape((-1,) + values.shape[1:])
+    suffix = ufunc.accumulate(padded[:, ::-1], axis=1)[:, ::-1].reshape((-1,) + values.shape[1:])
+    start = np.arange(n - window + 1)
+    out[window - 1:] = ufunc(suffix[start], prefix[start + window - 1])
+    return out
+
+def _rolling_max(values: np.ndarray, window: int) -> np.ndarray:
+    return _rolling_extreme(values, window, np.maximum)
+
+def _rolling_min(values: np.ndarray, window: int) -> np.ndarray:
+    return _rolling_extreme(values, window, np.minimum)
+
+def true_range(high, low, close) -> np.ndarray:
+    """ True range on 1-D or 2-D (bars x pairs) arrays, the first bar has
+        no previous close and falls back to high - low
+    """
+    high = _values(high)
+    low = _values(low)
+    close = _values(close)
+    prev_close = np.empty_like(close)
+    prev_close[0] = np.nan
+    prev_close[1:] = close[:-1]
+    return np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+def atr(high, low, close, window=14, method="rma", adjust=False) -> np.ndarray:
+    """ Average true range on arrays
+
+        Args:
+            method(str): "rma" (Wilder smoothing) or "sma"
+            adjust(bool): forwarded to ewm for "rma"
+    """
+    tr = true_range(high, low, close)
+    if method == "sma":
+        return _sma_values(tr, window)
+    elif method == "rma":
+        return _frame(tr).ewm(alpha=1 / window, min_periods=window, adjust=adjust).mean().to_numpy()
+    raise ValueError("ATR method must be either 'rma' or 'sma'")
+
+def rolling_high_low(high, low, window) -> tuple:
+    """ Rolling highest high and lowest low on arrays """
+    return _rolling_max(high, window), _rolling_min(low, window)
+
 def chop(high, low, close, window=14):
     ''' Choppiness indicator
     '''
-    tr1 = pd.DataFrame(high - low).rename(columns={0: 'tr1'})
-    tr2 = pd.DataFrame(abs(high - close.shift(1))
-                       ).rename(columns={0: 'tr2'})
-    tr3 = pd.DataFrame(abs(low - close.shift(1))
-                       ).rename(columns={0: 'tr3'})
-    frames = [tr1, tr2, tr3]
-    tr = pd.concat(frames, axis=1, join='inner').dropna().max(axis=1)
-    atr = tr.rolling(1).mean()
-    highh = high.rolling(window).max()
-    lowl = low.rolling(window).min()
-    chop_serie = 100 * np.log10((atr.rolling(window).sum()) /
-                          (highh - lowl)) / np.log10(window)
-    return pd.Series(chop_serie, name="CHOP")
+    tr = true_range(high, low, close)
+    # the first bar has no previous close and is left out of the sum
+    tr[0] = np.nan
+    tr_sum = _frame(tr).rolling(window=window, min_periods=window).sum().to_numpy()
+    highh, lowl = rolling_high_low(high, low, window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chop_serie = 100 * np.log10(tr_sum / (highh - lowl)) / np.log10(window)
+    return _wrap_like(close, chop_serie, "CHOP")
 
 def fear_and_greed(close):
     ''' Fear and greed indicator
@@ -107,6 +237,12 @@ class Trix():
 class VMC():
     """ VuManChu Cipher B + Divergences 
 
+        Outputs are computed lazily on float64 arrays and cached, so
+        wave_2 reuses the wave_1 EMA and outputs nobody asks for are never
+        computed. Passing DataFrames with one column per pair (see
+        `stack_pairs`) runs the whole universe in a single batch pass and
+        returns DataFrames with the same columns.
+
         Args:
             high(pandas.Series): dataset 'High' column.
             low(pandas.Series): dataset 'Low' column.
@@ -142,18 +278,46 @@ class VMC():
         self._rsiMFIperiod = rsiMFIperiod
         self._rsiMFIMultiplier = rsiMFIMultiplier
         self._rsiMFIPosY = rsiMFIPosY
-
-        self._run()
-        self.wave_1()
-
-    def _run(self) -> None:
-        self.hlc3 = (self._close + self._high + self._low)
-        self._esa = ta.trend.ema_indicator(
-            close=self.hlc3, window=self._wtChannelLen)
-        self._de = ta.trend.ema_indicator(
-            close=abs(self.hlc3 - self._esa), window=self._wtChannelLen)
-        self._rsi = ta.trend.sma_indicator(self._close, self._rsiMFIperiod)
-        self._ci = (self.hlc3 - self._esa) / (0.015 * self._de)
+        self._cache = {}
+
+    def _cached(self, key, compute) -> np.ndarray:
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def _hlc3(self) -> np.ndarray:
+        return self._cached("hlc3", lambda: (
+            _values(self._close) + _values(self._high) + _values(self._low)
+        ))
+
+    def _ci(self) -> np.ndarray:
+        def compute():
+            hlc3 = self._hlc3()
+            esa = _ema_values(hlc3, self._wtChannelLen)
+            de = _ema_values(np.abs(hlc3 - esa), self._wtChannelLen)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return (hlc3 - esa) / (0.015 * de)
+        return self._cached("ci", compute)
+
+    def _wt1(self) -> np.ndarray:
+        return self._cached("wt1", lambda: _ema_values(self._ci(), self._wtAverageLen))
+
+    def _wt2(self) -> np.ndarray:
+        return self._cached("wt2", lambda: _sma_values(self._wt1(), self._wtMALen))
+
+    def _money_flow(self) -> np.ndarray:
+        def compute():
+            high = _values(self._high)
+            low = _values(self._low)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                mfi = ((_values(self._close) - _values(self._open)) /
+                       (high - low)) * self._rsiMFIMultiplier
+            return _sma_values(mfi, self._rsiMFIperiod) - self._rsiMFIPosY
+        return self._cached("money_flow", compute)
+
+    @property
+    def hlc3(self):
+        return _wrap_like(self._close, self._hlc3())
 
     def wave_1(self) -> pd.Series:
         """VMC Wave 1 
@@ -161,8 +325,7 @@ class VMC():
         Returns:
             pandas.Series: New feature generated.
         """
-        wt1 = ta.trend.ema_indicator(self._ci, self._wtAverageLen)
-        return pd.Series(wt1, name="wt1")
+        return _wrap_like(self._close, self._wt1(), "wt1")
 
     def wave_2(self) -> pd.Series:
         """VMC Wave 2
@@ -170,8 +333,7 @@ class VMC():
         Returns:
             pandas.Series: New feature generated.
         """
-        wt2 = ta.trend.sma_indicator(self.wave_1(), self._wtMALen)
-        return pd.Series(wt2, name="wt2")
+        return _wrap_like(self._close, self._wt2(), "wt2")
 
     def money_flow(self) -> pd.Series:
         """VMC Money Flow
@@ -179,11 +341,7 @@ class VMC():
         Returns:
             pandas.Series: New feature generated.
         """
-        mfi = ((self._close - self._open) /
-               (self._high - self._low)) * self._rsiMFIMultiplier
-        rsi = ta.trend.sma_indicator(mfi, self._rsiMFIperiod)
-        money_flow = rsi - self._rsiMFIPosY
-        return pd.Series(money_flow, name="money_flow")
+        return _wrap_like(self._close, self._money_flow(), "money_flow")
 
 
 def heikinAshiDf(df):
@@ -241,18 +399,34 @@ class SmoothedHeikinAshi():
         return self.smooth_ha_open
 
 
+def volume_anomality_values(volume, close, volume_window=10) -> np.ndarray:
+    """ Signed volume anomaly code on 1-D or 2-D (bars x pairs) arrays
+
+        1: volume > 1.5 x rolling mean, 2: > 2 x rolling mean, 3: rolling max,
+        negated on bars closing below the previous close.
+
+        Returns:
+            np.ndarray: int8 codes with the shape of `volume`
+    """
+    volume = _values(volume)
+    close = _values(close)
+    mean_volume = _sma_values(volume, volume_window)
+    max_volume = _rolling_max(volume, volume_window)
+    with np.errstate(invalid="ignore"):
+        code = np.select(
+            [volume >= max_volume, volume > 2 * mean_volume, volume > 1.5 * mean_volume],
+            [3, 2, 1],
+            0,
+        ).astype(np.int8)
+        code[1:][close[:-1] > close[1:]] *= -1
+    return code
+
 def volume_anomality(df, volume_window=10):
-    dfInd = df.copy()
-    dfInd["VolAnomaly"] = 0
-    dfInd["PreviousClose"] = dfInd["close"].shift(1)
-    dfInd['MeanVolume'] = dfInd['volume'].rolling(volume_window).mean()
-    dfInd['MaxVolume'] = dfInd['volume'].rolling(volume_window).max()
-    dfInd.loc[dfInd['volume'] > 1.5 * dfInd['MeanVolume'], "VolAnomaly"] = 1
-    dfInd.loc[dfInd['volume'] > 2 * dfInd['MeanVolume'], "VolAnomaly"] = 2
-    dfInd.loc[dfInd['volume'] >= dfInd['MaxVolume'], "VolAnomaly"] = 3
-    dfInd.loc[dfInd['PreviousClose'] > dfInd['close'],
-              "VolAnomaly"] = (-1) * dfInd["VolAnomaly"]
-    return dfInd["VolAnomaly"]
+    return pd.Series(
+        volume_anomality_values(df["volume"], df["close"], volume_window),
+        index=df.index,
+        name="VolAnomaly",
+    )
 
 class SuperTrend():
     def __init__(
@@ -271,48 +445,41 @@ class SuperTrend():
         self._run()
         
     def _run(self):
-        # calculate ATR
-        price_diffs = [self.high - self.low, 
-                    self.high - self.close.shift(), 
-                    self.close.shift() - self.low]
-        true_range = pd.concat(price_diffs, axis=1)
-        true_range = true_range.abs().max(axis=1)
         # default ATR calculation in supertrend indicator
-        atr = true_range.ewm(alpha=1/self.atr_window,min_periods=self.atr_window).mean() 
-        # atr = ta.volatility.average_true_range(high, low, close, atr_period)
-        # df['atr'] = df['tr'].rolling(atr_period).mean()
+        atr_values = atr(self.high, self.low, self.close, self.atr_window, method="rma", adjust=True)
+        close = _values(self.close)
         
         # HL2 is simply the average of high and low prices
-        hl2 = (self.high + self.low) / 2
+        hl2 = (_values(self.high) + _values(self.low)) / 2
         # upperband and lowerband calculation
         # notice that final bands are set to be equal to the respective bands
-        final_upperband = upperband = hl2 + (self.atr_multi * atr)
-        final_lowerband = lowerband = hl2 - (self.atr_multi * atr)
+        final_upperband = hl2 + (self.atr_multi * atr_values)
+        final_lowerband = hl2 - (self.atr_multi * atr_values)
         
         # initialize Supertrend column to True
-        supertrend = [True] * len(self.close)
+        supertrend = np.ones(len(close), dtype=bool)
         
-        for i in range(1, len(self.close)):
+        for i in range(1, len(close)):
             curr, prev = i, i-1
             
             # if current close price crosses above upperband
-            if self.close[curr] > final_upperband[prev]:
+            if close[curr] > final_upperband[prev]:
                 supertrend[curr] = True
             # if current close price crosses below lowerband
-            elif self.close[curr] < final_lowerband[prev]:
+            elif close[curr] < final_lowerband[prev]:
                 supertrend[curr] = False
             # else, the trend continues
             else:
                 supertrend[curr] = supertrend[prev]
                 
                 # adjustment to the final bands
-                if supertrend[curr] == True and final_lowerband[curr] < final_lowerband[prev]:
+                if supertrend[curr] and final_lowerband[curr] < final_lowerband[prev]:
                     final_lowerband[curr] = final_lowerband[prev]
-                if supertrend[curr] == False and final_upperband[curr] > final_upperband[prev]:
+                if not supertrend[curr] and final_upperband[curr] > final_upperband[prev]:
                     final_upperband[curr] = final_upperband[prev]
 
             # to remove bands according to the trend direction
-            if supertrend[curr] == True:
+            if supertrend[curr]:
                 final_upperband[curr] = np.nan
             else:
                 final_lowerband[curr] = np.nan
@@ -321,7 +488,7 @@ class SuperTrend():
             'Supertrend': supertrend,
             'Final Lowerband': final_lowerband,
             'Final Upperband': final_upperband
-        })
+        }, index=self.close.index)
         
     def super_trend_upper(self):
         return self.st['Final Upperband']
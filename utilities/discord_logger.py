@@ -1,11 +1,30 @@
-import aiohttp
 import json
+import aiohttp
+from utilities.http_transport import shared_session
 
 class DiscordLogger:
     def __init__(self, webhook_url: str=None):
         self.webhook_url = webhook_url
         self.messages = []
 
+    async def _post(self, data):
+        # pooled connection of the shared session, kept open between messages
+        session = shared_session()
+        if session is None:
+            # no shared session available, one session for this message only
+            async with aiohttp.ClientSession() as session:
+                await self._send(session, data)
+            return
+        await self._send(session, data)
+
+    async def _send(self, session, data):
+        async with session.post(
+            self.webhook_url,
+            data=json.dumps(data),
+            headers={"Content-Type": "application/json"}
+        ) as resp:
+            await resp.read()
+
     def log(self, message: str):
         print(message)
         self.messages.append(message)
@@ -32,12 +51,7 @@ class DiscordLogger:
             }]
         }
         
-        async with aiohttp.ClientSession() as session:
-            await session.post(
-                self.webhook_url,
-                data=json.dumps(data),
-                headers={"Content-Type": "application/json"}
-            )
+        await self._post(data)
 
     async def send_now(self, message: str, level: str = "INFO"):
         print(message)
@@ -62,11 +76,6 @@ class DiscordLogger:
             }]
         }
         
-        async with aiohttp.ClientSession() as session:
-            await session.post(
-                self.webhook_url,
-                data=json.dumps(data),
-                headers={"Content-Type": "application/json"}
-            )
+        await self._post(data)
 
 
@@ -0,0 +1,60 @@
+import asyncio
+import ssl
+import aiohttp
+import certifi
+
+# connections kept open in the pool, in total and per host
+CONNECTION_LIMIT = 100
+CONNECTION_LIMIT_PER_HOST = 30
+# seconds an idle keep-alive connection and a resolved address are reused
+KEEPALIVE_TIMEOUT = 60
+DNS_CACHE_TTL = 300
+
+_session = None
+_session_loop = None
+
+
+def shared_session() -> aiohttp.ClientSession:
+    """ aiohttp session shared by the adapters and the Discord logger of the
+        running event loop: one pool of keep-alive connections (one TCP and
+        TLS handshake per host instead of per client) and a DNS cache
+
+        Returns None outside of an event loop, close_shared_session() at the
+        end of the run closes it.
+    """
+    global _session, _session_loop
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+    if _session is None or _session.closed or _session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            ssl=ssl.create_default_context(cafile=certifi.where()),
+            limit=CONNECTION_LIMIT,
+            limit_per_host=CONNECTION_LIMIT_PER_HOST,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=DNS_CACHE_TTL,
+            enable_cleanup_closed=True,
+        )
+        _session = aiohttp.ClientSession(connector=connector)
+        _session_loop = loop
+    return _session
+
+
+def shared_session_config(config=None) -> dict:
+    """ ccxt exchange config using the shared session, the session is not
+        closed by the exchange close()
+    """
+    config = dict(config) if config is not None else {}
+    session = shared_session()
+    if session is None:
+        return config
+    config["session"] = session
+    return config
+
+
+async def close_shared_session():
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
@@ -0,0 +1,175 @@
+import asyncio
+import math
+import os
+import time
+import pandas as pd
+from utilities.multi_timeframe import TIMEFRAME_MS
+
+# candles returned by one candleSnapshot request at most
+CANDLE_SNAPSHOT_LIMIT = 5000
+# info requests weigh 20, candleSnapshot adds 1 per 60 candles returned
+INFO_REQUEST_WEIGHT = 20
+CANDLES_PER_WEIGHT = 60
+
+
+class WeightLimiter:
+    """ Token bucket on Hyperliquid request weights (1200 per minute and
+        per IP by default), refilled continuously
+    """
+
+    def __init__(self, weight_per_minute=1200):
+        self.capacity = weight_per_minute
+        self.tokens = weight_per_minute
+        self.rate = weight_per_minute / 60
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, weight):
+        weight = min(weight, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                await asyncio.sleep((weight - self.tokens) / self.rate)
+
+
+class HyperliquidCandles:
+    """ OHLCV history from the info candleSnapshot request
+
+        Windows of 5000 candles are requested newest first, a few at a time
+        within the request weight budget, until the range is covered or the
+        exchange has no older candles. With a cache_dir, candles are kept on
+        disk per coin and timeframe and only the missing ranges (plus the
+        last, still open, candle) are requested again, so the history kept
+        locally can grow beyond what the API serves. Once the exchange
+        returned nothing before the first cached candle, the cache records
+        it (attrs["first_available_ts"]) and that range is not requested
+        again.
+
+        Args:
+            session: ccxt hyperliquid session, used for publicPostInfo
+            cache_dir(str): directory of the cache files, None to disable
+            max_concurrency(int): requests in flight at most
+            limiter(WeightLimiter): weight budget, shared between instances
+                hitting the API from the same IP
+    """
+
+    def __init__(self, session, cache_dir=None, max_concurrency=4, limiter=None):
+        self._session = session
+        self.cache_dir = cache_dir
+        self.max_concurrency = max_concurrency
+        self.limiter = limiter if limiter is not None else WeightLimiter()
+
+    def _cache_path(self, coin, timeframe) -> str:
+        return os.path.join(self.cache_dir, f"{coin}-{timeframe}.pkl")
+
+    def _load_cache(self, coin, timeframe) -> pd.DataFrame:
+        if self.cache_dir is None:
+            return None
+        try:
+            return pd.read_pickle(self._cache_path(coin, timeframe))
+        except Exception:
+            return None
+
+    def _save_cache(self, coin, timeframe, df):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._cache_path(coin, timeframe)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+
+    async def _fetch_window(self, coin, timeframe, start_ts, end_ts) -> list:
+        candles = min(CANDLE_SNAPSHOT_LIMIT, math.ceil((end_ts - start_ts) / TIMEFRAME_MS[timeframe]))
+        await self.limiter.acquire(INFO_REQUEST_WEIGHT + math.ceil(candles / CANDLES_PER_WEIGHT))
+        return await self._session.publicPostInfo(params={
+            "type": "candleSnapshot",
+            "req": {
+                "coin": coin,
+                "interval": timeframe,
+                "startTime": start_ts,
+                "endTime": end_ts,
+            },
+        })
+
+    async def _fetch_range(self, coin, timeframe, start_ts, end_ts) -> tuple:
+        """ Candles between start_ts and end_ts, and whether the exchange ran
+            out of older candles (the oldest window requested came back empty)
+        """
+        window = CANDLE_SNAPSHOT_LIMIT * TIMEFRAME_MS[timeframe]
+        windows = []
+        current_ts = end_ts
+        while current_ts > start_ts:
+            windows.append((max(start_ts, current_ts - window), current_ts))
+            current_ts -= window
+        candles = []
+        for i in range(0, len(windows), self.max_concurrency):
+            results = await asyncio.gather(
+                *[self._fetch_window(coin, timeframe, start, end) for start, end in windows[i:i + self.max_concurrency]]
+            )
+            for result in results:
+                candles.extend(result)
+            # an empty oldest window means the exchange keeps no older candles,
+            # an empty window in between is only a gap
+            if len(results[-1]) == 0:
+                return candles, True
+        return candles, False
+
+    @staticmethod
+    def _to_frame(candles) -> pd.DataFrame:
+        df = pd.DataFrame(
+            {
+                "date": [candle["t"] for candle in candles],
+                "open": [float(candle["o"]) for candle in candles],
+                "high": [float(candle["h"]) for candle in candles],
+                "low": [float(candle["l"]) for candle in candles],
+                "close": [float(candle["c"]) for candle in candles],
+                "volume": [float(candle["v"]) for candle in candles],
+            }
+        )
+        df = df.set_index(df["date"])
+        df.index = pd.to_datetime(df.index, unit="ms")
+        del df["date"]
+        return df
+
+    async def get_ohlcv(self, coin, timeframe, start_ts, end_ts=None) -> pd.DataFrame:
+        """ Candles of coin opened between start_ts and end_ts (ms) """
+        if end_ts is None:
+            end_ts = int(time.time() * 1000)
+        cached = self._load_cache(coin, timeframe)
+        first_available_ts = None
+        # the range reaching back to start_ts, if requested
+        older_range = (start_ts, end_ts)
+        ranges = [older_range]
+        if cached is not None and len(cached) > 0:
+            first_ts = int(cached.index[0].value // 10**6)
+            last_ts = int(cached.index[-1].value // 10**6)
+            first_available_ts = cached.attrs.get("first_available_ts")
+            # the last cached candle may have been saved while still open
+            ranges = [(last_ts, end_ts)]
+            older_range = None
+            if start_ts < first_ts and first_available_ts != first_ts:
+                older_range = (start_ts, first_ts)
+                ranges.append(older_range)
+
+        fetched = await asyncio.gather(
+            *[self._fetch_range(coin, timeframe, start, end) for start, end in ranges]
+        )
+        frames = [self._to_frame(candles) for candles, _ in fetched]
+        if cached is not None:
+            frames.insert(0, cached)
+        df = pd.concat(frames)
+        df = df[~df.index.duplicated(keep="last")].sort_index()
+        exhausted = older_range is not None and fetched[ranges.index(older_range)][1]
+        if exhausted and len(df) > 0:
+            first_available_ts = int(df.index[0].value // 10**6)
+        df.attrs = {"first_available_ts": first_available_ts} if first_available_ts is not None else {}
+        if self.cache_dir is not None:
+            self._save_cache(coin, timeframe, df)
+        return df[
+            (df.index >= pd.to_datetime(start_ts, unit="ms"))
+            & (df.index <= pd.to_datetime(end_ts, unit="ms"))
+        ]
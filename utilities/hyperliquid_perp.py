@@ -1,367 +1,551 @@
-# pip install ccxt pandas pydantic ta
-from typing import List, Optional
-import ccxt.async_support as ccxt
-import pandas as pd
-from pydantic import BaseModel
-from decimal import Decimal, getcontext, ROUND_DOWN
-import math
-import ta
-import time
-
-class UsdtBalance(BaseModel):
-    total: float
-    free: float
-    used: float
-
-
-class Info(BaseModel):
-    success: bool
-    message: str
-
-
-class Order(BaseModel):
-    id: str
-    pair: str
-    type: str
-    side: str
-    price: float
-    size: float
-    reduce: bool
-    filled: float
-    remaining: float
-    timestamp: int
-
-
-class TriggerOrder(BaseModel):
-    id: str
-    pair: str
-    type: str
-    side: str
-    price: float
-    trigger_price: float
-    size: float
-    reduce: bool
-    timestamp: int
-
-
-class Position(BaseModel):
-    pair: str
-    side: str
-    size: float
-    usd_size: float
-    entry_price: float
-    current_price: float
-    unrealized_pnl: float
-    liquidation_price: float
-    margin_mode: str
-    leverage: int
-    hedge_mode: bool
-    open_timestamp: int = 0
-    take_profit_price: float | None = None
-    stop_loss_price: float | None = None
-
-# class Market(BaseModel):
-#     internal_pair: str
-#     base: str
-#     quote: str
-#     price_precision: float
-#     contract_precision: float
-#     contract_size: Optional[float] = 1.0
-#     min_contracts: float
-#     max_contracts: Optional[float] = float('inf')
-#     min_cost: Optional[float] = 0.0
-#     max_cost: Optional[float] = float('inf')
-#     coin_index: Optional[int] = 0
-#     market_price: Optional[float] = 0.0
-
-
-def get_price_precision(price: float) -> float:
-    log_price = math.log10(price)
-    order = math.floor(log_price)
-    precision = 10 ** (order - 4)
-    return precision
-    
-def number_to_str(n: float) -> str:
-    s = format(n, 'f')
-    s = s.rstrip('0')
-    if s.endswith('.'):
-        s = s[:-1]
-    
-    return s
-
-
-class PerpHyperliquid:
-    def __init__(self, public_api=None, secret_api=None):
-        hyperliquid_auth_object = {
-            "apiKey": public_api,
-            "secret": secret_api,
-        }
-        self.public_api = public_api
-        getcontext().prec = 10
-        if hyperliquid_auth_object["secret"] == None:
-            self._auth = False
-            self._session = ccxt.hyperliquid()
-        else:
-            self._auth = True
-            self._session = ccxt.hyperliquid(hyperliquid_auth_object)
-        
-     async def load_markets(self):
-        self.market = await self._session.load_markets()
-
-    async def close(self):
-        await self._session.close()
-
-    def ext_pair_to_pair(self, ext_pair) -> str:
-        return f"{ext_pair}:USDT"
-
-    def pair_to_ext_pair(self, pair) -> str:
-        return pair+"/USD"
-    
-    # def ext_pair_to_base(self, ext_pair) -> str:
-    #     return ext_pair.split("/")[0]
-
-    def get_pair_info(self, ext_pair) -> str:
-        pair = self.ext_pair_to_pair(ext_pair)
-        if pair in self.market:
-            return self.market[pair]
-        else:
-            return None
-        
-   def amount_to_precision(self, pair: str, amount: float) -> float:
-        pair = self.ext_pair_to_pair(pair)
-        try:
-            return self._session.amount_to_precision(pair, amount)
-        except Exception as e:
-            return 0
-    
-    def price_to_precision(self, pair: str, price: float) -> float:
-        pair = self.ext_pair_to_pair(pair)
-        return self._session.price_to_precision(pair, price)
-
-    async def get_last_ohlcv(self, pair, timeframe, limit=1000) -> pd.DataFrame:
-        if limit > 5000:
-            limit = 5000
-        base_pair = self.ext_pair_to_base(pair)
-        ts_dict = {
-            "1m": 1 * 60 * 1000,
-            "5m": 5 * 60 * 1000,
-            "15m": 15 * 60 * 1000,
-            "1h": 60 * 60 * 1000,
-            "2h": 2 * 60 * 60 * 1000,
-            "4h": 4 * 60 * 60 * 1000,
-            "1d": 24 * 60 * 60 * 1000,
-        }
-        end_ts = int(time.time() * 1000)
-        start_ts = end_ts - ((limit) * ts_dict[timeframe])
-        current_ts = start_ts
-        tasks = []
-        while current_ts < end_ts:
-            req_end_ts = min(current_ts + (hyperliquid_limit * ts_dict[timeframe]), end_ts)
-            tasks.append(
-                self._session.fetch_ohlcv(
-                    pair,
-                    timeframe,
-                    params={
-                        "limit": hyperliquid_limit,
-                        "startTime": str(current_ts),
-                        "endTime": str(req_end_ts),
-                    },
-                )
-            )
-            current_ts += (hyperliquid_limit * ts_dict[timeframe]) + 1
-        ohlcv_unpack = await asyncio.gather(*tasks)
-        ohlcv_list = list(itertools.chain.from_iterable(ohlcv_unpack))
-        df = pd.DataFrame(
-            ohlcv_list, columns=["date", "open", "high", "low", "close", "volume"]
-        )
-        df = df.set_index(df["date"])
-        df.index = pd.to_datetime(df.index, unit="ms")
-        df = df.sort_index()
-        del df["date"]
-        return df
-
-    async def get_balance(self) -> UsdtBalance:
-        data = await self._session.publicPostInfo(params={
-            "type": "clearinghouseState",
-            "user": self.public_api,
-        })
-        total = float(data["marginSummary"]["accountValue"])
-        used = float(data["marginSummary"]["totalMarginUsed"])
-        free = total - used
-        return UsdtBalance(
-            total=total,
-            free=free,
-            used=used,
-        )
-
-    async def set_margin_mode_and_leverage(self, pair, margin_mode, leverage):
-        if margin_mode not in ["cross", "isolated"]:
-            raise Exception("Margin mode must be either 'cross' or 'isolated'")
-        asset_index = self.market[pair].coin_index
-        try:
-            nonce = int(time.time() * 1000)
-            req_body = {}
-            action = {
-                "type": "updateLeverage",
-                "asset": asset_index,
-                "isCross": margin_mode == "cross",
-                "leverage": leverage,
-            }
-            signature = self._session.sign_l1_action(action, nonce)
-            req_body["action"] = action
-            req_body["nonce"] = nonce
-            req_body["signature"] = signature
-            await self._session.private_post_exchange(params=req_body)
-        except Exception as e:
-            raise e
-
-        return Info(
-            success=True,
-            message=f"Margin mode and leverage set to {margin_mode} and {leverage}x",
-        )
-
-    async def get_open_positions(self, pairs=[]) -> List[Position]:
-        data = await self._session.publicPostInfo(params={
-            "type": "clearinghouseState",
-            "user": self.public_api,
-        })
-        # return data
-        positions_data = data["assetPositions"]
-        positions = []
-        for position_data in positions_data:
-            position = position_data["position"]
-            if self.pair_to_ext_pair(position["coin"]) not in pairs and len(pairs) > 0:
-                continue
-            type_mode = position_data["type"]
-            hedge_mode = True if type_mode != "oneWay" else False
-            size = float(position["szi"])
-            side = "long" if size > 0 else "short"
-            size = abs(size)
-            usd_size = float(position["positionValue"])
-            current_price = usd_size / size
-            positions.append(
-                Position(
-                    pair=self.pair_to_ext_pair(position["coin"]),
-                    side=side,
-                    size=size,
-                    usd_size=usd_size,
-                    entry_price=float(position["entryPx"]),
-                    current_price=current_price,
-                    unrealized_pnl=float(position["unrealizedPnl"]),
-                    liquidation_price=float(position["liquidationPx"]),
-                    margin_mode=position["leverage"]["type"],
-                    leverage=position["leverage"]["value"],
-                    hedge_mode=hedge_mode,
-                )
-            )
-
-        return positions
-
-    async def place_order(
-        self,
-        pair,
-        side,
-        price,
-        size,
-        type="limit",
-        reduce=False,
-        error=True,
-        market_max_spread=0.1,
-    ) -> Order:
-        if price is None:
-            price = self.market[pair].market_price
-        try:
-            asset_index = self.market[pair].coin_index
-            nonce = int(time.time() * 1000)
-            is_buy = side == "buy"
-            req_body = {}
-            if type == "market":
-                if side == "buy":
-                    price = price * (1 + market_max_spread)
-                else:
-                    price = price * (1 - market_max_spread)
-
-            print(number_to_str(self.price_to_precision(pair, price)))
-            action = {
-                "type": "order",
-                "orders": [{
-                    "a": asset_index,
-                    "b": is_buy,
-                    "p": number_to_str(self.price_to_precision(pair, price)),
-                    "s": number_to_str(self.size_to_precision(pair, size)),
-                    "r": reduce,
-                    "t": {"limit":{"tif": "Gtc"}}
-                }],
-                "grouping": "na",
-                "brokerCode": 1,
-            }
-            signature = self._session.sign_l1_action(action, nonce)
-            req_body["action"] = action
-            req_body["nonce"] = nonce
-            req_body["signature"] = signature
-            resp = await self._session.private_post_exchange(params=req_body)
-            
-            order_resp = resp["response"]["data"]["statuses"][0]
-            order_key = list(order_resp.keys())[0]
-            order_id = resp["response"]["data"]["statuses"][0][order_key]["oid"]
-
-            order = await self.get_order_by_id(order_id)
-
-            if order_key == "filled":
-                order_price = resp["response"]["data"]["statuses"][0][order_key]["avgPx"]
-                order.price = float(order_price)
-            
-            return order
-        except Exception as e:
-            if error:
-                raise e
-            else:
-                print(e)
-                return None
-
-
-    async def get_order_by_id(self, order_id) -> Order:
-        order_id = int(order_id)
-        data = await self._session.publicPostInfo(params={
-            "user": self.public_api,
-            "type": "orderStatus",
-            "oid": order_id,
-        })
-        order = data["order"]["order"]
-        side_map = {
-            "A": "sell",
-            "B": "buy",
-        }
-        return Order(
-            id=str(order_id),
-            pair=self.pair_to_ext_pair(order["coin"]),
-            type=order["orderType"].lower(),
-            side=side_map[order["side"]],
-            price=float(order["limitPx"]),
-            size=float(order["origSz"]),
-            reduce=order["reduceOnly"],
-            filled=float(order["origSz"]) - float(order["sz"]),
-            remaining=float(order["sz"]),
-            timestamp=int(order["timestamp"]),
-        )
-
-   async def cancel_orders(self, pair, ids=[]):
-        try:
-            pair = self.ext_pair_to_pair(pair)
-            resp = await self._session.cancel_orders(
-                ids=ids,
-                symbol=pair,
-            )
-            return Info(success=True, message=f"{len(resp)} Orders cancelled")
-        except Exception as e:
-            return Info(success=False, message="Error or no orders to cancel")
-
-    async def cancel_trigger_orders(self, pair, ids=[]):
-        try:
-            pair = self.ext_pair_to_pair(pair)
-            resp = await self._session.cancel_orders(
-                ids=ids, symbol=pair, params={"stop": True}
-            )
-            return Info(success=True, message=f"{len(resp)} Trigger Orders cancelled")
-        except Exception as e:
-            return Info(success=False, message="Error or no orders to cancel")
+from typing import Dict, List, Optional
+import ccxt.async_support as ccxt
+import ccxt.pro as ccxtpro
+import asyncio
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+import math
+import time
+from utilities.http_transport import shared_session_config
+from utilities.hyperliquid_candles import HyperliquidCandles
+from utilities.multi_timeframe import TIMEFRAME_MS
+from utilities.live_stream import ExchangeStream, LiveView
+from utilities.recorder import attach_from_env
+from utilities.single_flight import READ_MEMO_TTL, SingleFlight, invalidates, single_flight
+
+@dataclass(slots=True)
+class UsdtBalance:
+    total: float
+    free: float
+    used: float
+
+
+@dataclass(slots=True)
+class Info:
+    success: bool
+    message: str
+
+
+@dataclass(slots=True)
+class Order:
+    id: str
+    pair: str
+    type: str
+    side: str
+    price: float
+    size: float
+    reduce: bool
+    filled: float
+    remaining: float
+    timestamp: int
+
+
+@dataclass(slots=True)
+class TriggerOrder:
+    id: str
+    pair: str
+    type: str
+    side: str
+    price: float
+    trigger_price: float
+    size: float
+    reduce: bool
+    timestamp: int
+
+
+@dataclass(slots=True)
+class CancelResult:
+    id: str
+    pair: str
+    success: bool
+    message: str
+
+
+@dataclass(slots=True)
+class Position:
+    pair: str
+    side: str
+    size: float
+    usd_size: float
+    entry_price: float
+    current_price: float
+    unrealized_pnl: float
+    liquidation_price: float
+    margin_mode: str
+    leverage: int
+    hedge_mode: bool
+    open_timestamp: int = 0
+    take_profit_price: float | None = None
+    stop_loss_price: float | None = None
+
+@dataclass(slots=True)
+class Market:
+    pair: str
+    base: str
+    coin_index: int
+    size_decimals: int
+    price_decimals: int
+    market_price: float
+
+
+class HyperliquidMarkets:
+    """ Perp metadata (meta) and mid prices (allMids) kept column-wise
+
+        The asset index of a coin is its position in the meta universe, so
+        every array below is indexed by asset index. self.market[pair] builds
+        a Market snapshot from these arrays without any request.
+    """
+
+    def __init__(self):
+        self.bases = []
+        self.index = {}
+        self.size_decimals = np.zeros(0, dtype=np.int8)
+        self.price_decimals = np.zeros(0, dtype=np.int8)
+        self.mids = np.zeros(0, dtype=np.float64)
+        self.mids_timestamp = 0
+
+    def load(self, meta, all_mids):
+        universe = meta["universe"]
+        self.bases = [asset["name"] for asset in universe]
+        self.index = {f"{base}/USD": i for i, base in enumerate(self.bases)}
+        self.size_decimals = np.array([asset["szDecimals"] for asset in universe], dtype=np.int8)
+        # perp prices accept at most 6 - szDecimals decimals
+        self.price_decimals = (6 - self.size_decimals).astype(np.int8)
+        self.mids = np.full(len(self.bases), np.nan)
+        self.update_mids(all_mids)
+
+    def update_mids(self, all_mids):
+        for base, mid in all_mids.items():
+            i = self.index.get(f"{base}/USD")
+            if i is not None:
+                self.mids[i] = float(mid)
+        self.mids_timestamp = int(time.time() * 1000)
+
+    def __contains__(self, pair) -> bool:
+        return pair in self.index
+
+    def __getitem__(self, pair) -> Market:
+        i = self.index[pair]
+        return Market(
+            pair=pair,
+            base=self.bases[i],
+            coin_index=i,
+            size_decimals=int(self.size_decimals[i]),
+            price_decimals=int(self.price_decimals[i]),
+            market_price=float(self.mids[i]),
+        )
+
+
+def get_price_precision(price: float) -> float:
+    if not math.isfinite(price) or price <= 0:
+        raise Exception(f"Invalid price {price}, no precision for it")
+    log_price = math.log10(price)
+    order = math.floor(log_price)
+    precision = 10 ** (order - 4)
+    return precision
+    
+def number_to_str(n: float) -> str:
+    s = format(n, 'f')
+    s = s.rstrip('0')
+    if s.endswith('.'):
+        s = s[:-1]
+    
+    return s
+
+
+class PerpHyperliquid:
+    def __init__(self, public_api=None, secret_api=None, ohlcv_cache_dir=None, mids_refresh_interval=None):
+        hyperliquid_auth_object = {
+            "apiKey": public_api,
+            "secret": secret_api,
+        }
+        self.public_api = public_api
+        if hyperliquid_auth_object["secret"] == None:
+            self._auth = False
+            self._session = ccxt.hyperliquid(shared_session_config())
+        else:
+            self._auth = True
+            self._session = ccxt.hyperliquid(shared_session_config(hyperliquid_auth_object))
+        attach_from_env(self._session)
+        self._flight = SingleFlight()
+        self._stream = None
+        self.live = None
+        self.market = HyperliquidMarkets()
+        self._candles = HyperliquidCandles(self._session, ohlcv_cache_dir)
+        self._mids_task = None
+        self.mids_refresh_interval = mids_refresh_interval
+
+    async def load_markets(self):
+        """ The mid prices, used by market orders without a price, are the
+            ones of this call. Long running callers relying on fresh mids set
+            mids_refresh_interval (seconds) to refresh them in the background,
+            or call refresh_mids() / start_mids_refresh() themselves.
+        """
+        meta, all_mids = await asyncio.gather(
+            self._session.publicPostInfo(params={"type": "meta"}),
+            self._session.publicPostInfo(params={"type": "allMids"}),
+        )
+        self.market.load(meta, all_mids)
+        if self.mids_refresh_interval is not None:
+            self.start_mids_refresh(self.mids_refresh_interval)
+
+    async def refresh_mids(self):
+        self.market.update_mids(
+            await self._session.publicPostInfo(params={"type": "allMids"})
+        )
+
+    def start_mids_refresh(self, interval=5):
+        """ Keep market prices fresh in the background, every `interval`
+            seconds, until close()
+        """
+        async def refresh_loop():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.refresh_mids()
+                except Exception as e:
+                    print(f"Error refreshing Hyperliquid mids => {str(e)}")
+
+        if self._mids_task is None:
+            self._mids_task = asyncio.create_task(refresh_loop())
+
+    def start_stream(self, pairs, timeframes=[], tickers=True, ws_urls=None) -> LiveView:
+        """ Subscribe to the candles (one subscription per timeframe) and
+            tickers of pairs over WebSocket. Returns the LiveView kept up to
+            date, also in self.live. Positions and orders are not streamed
+            on Hyperliquid.
+
+            Args:
+                ws_urls(dict): replaces urls["api"]["ws"] of the ccxt pro
+                    session, e.g. a local server in tests
+        """
+        ws_session = ccxtpro.hyperliquid()
+        if ws_urls is not None:
+            ws_session.urls["api"]["ws"] = ws_urls
+        self.live = LiveView()
+        self._stream = ExchangeStream(ws_session, self.live, lambda symbol: self.pair_to_ext_pair(symbol.split("/")[0]))
+        self._stream.start(
+            [self.ext_pair_to_pair(pair) for pair in pairs], timeframes, tickers=tickers
+        )
+        return self.live
+
+    async def close(self):
+        if self._stream is not None:
+            await self._stream.close()
+            self._stream = None
+        if self._mids_task is not None:
+            self._mids_task.cancel()
+            self._mids_task = None
+        await self._session.close()
+
+    def ext_pair_to_pair(self, ext_pair) -> str:
+        return f"{self.ext_pair_to_base(ext_pair)}/USDC:USDC"
+
+    def pair_to_ext_pair(self, pair) -> str:
+        return pair+"/USD"
+
+    def ext_pair_to_base(self, ext_pair) -> str:
+        return ext_pair.split("/")[0]
+
+    def get_pair_info(self, ext_pair) -> Market:
+        if ext_pair in self.market:
+            return self.market[ext_pair]
+        else:
+            return None
+
+    def size_to_precision(self, pair: str, size: float) -> float:
+        """ Round down to the size decimals of the asset """
+        factor = 10.0 ** self.market.size_decimals[self.market.index[pair]]
+        # round first so 0.3 * 10 = 2.9999999999999996 floors to 3
+        return math.floor(round(size * factor, 6)) / factor
+
+    def amount_to_precision(self, pair: str, amount: float) -> float:
+        try:
+            return self.size_to_precision(pair, amount)
+        except Exception as e:
+            return 0
+
+    def price_to_precision(self, pair: str, price: float) -> float:
+        """ At most 5 significant figures and the asset price decimals,
+            integer prices always being valid
+        """
+        if not math.isfinite(price) or price <= 0:
+            raise Exception(f"Invalid price {price} for {pair}, is the pair listed in allMids?")
+        significant = 4 - math.floor(math.log10(price))
+        decimals = max(0, min(int(self.market.price_decimals[self.market.index[pair]]), significant))
+        return round(price, decimals)
+
+    @single_flight(ttl=READ_MEMO_TTL, copy_result=True)
+    async def get_last_ohlcv(self, pair, timeframe, limit=1000) -> pd.DataFrame:
+        end_ts = int(time.time() * 1000)
+        start_ts = end_ts - ((limit) * TIMEFRAME_MS[timeframe])
+        df = await self._candles.get_ohlcv(
+            self.ext_pair_to_base(pair), timeframe, start_ts, end_ts
+        )
+        return df.iloc[-limit:]
+
+    @single_flight(ttl=READ_MEMO_TTL)
+    async def _clearinghouse_state(self) -> dict:
+        """ Balance and positions of the account, one request for both """
+        return await self._session.publicPostInfo(params={
+            "type": "clearinghouseState",
+            "user": self.public_api,
+        })
+
+    async def get_balance(self) -> UsdtBalance:
+        data = await self._clearinghouse_state()
+        total = float(data["marginSummary"]["accountValue"])
+        used = float(data["marginSummary"]["totalMarginUsed"])
+        free = total - used
+        return UsdtBalance(
+            total=total,
+            free=free,
+            used=used,
+        )
+
+    async def set_margin_mode_and_leverage(self, pair, margin_mode, leverage):
+        if margin_mode not in ["cross", "isolated"]:
+            raise Exception("Margin mode must be either 'cross' or 'isolated'")
+        asset_index = self.market[pair].coin_index
+        await self._post_action({
+            "type": "updateLeverage",
+            "asset": asset_index,
+            "isCross": margin_mode == "cross",
+            "leverage": leverage,
+        })
+
+        return Info(
+            success=True,
+            message=f"Margin mode and leverage set to {margin_mode} and {leverage}x",
+        )
+
+    async def get_open_positions(self, pairs=[]) -> List[Position]:
+        data = await self._clearinghouse_state()
+        # return data
+        positions_data = data["assetPositions"]
+        positions = []
+        for position_data in positions_data:
+            position = position_data["position"]
+            if self.pair_to_ext_pair(position["coin"]) not in pairs and len(pairs) > 0:
+                continue
+            type_mode = position_data["type"]
+            hedge_mode = True if type_mode != "oneWay" else False
+            size = float(position["szi"])
+            side = "long" if size > 0 else "short"
+            size = abs(size)
+            usd_size = float(position["positionValue"])
+            current_price = usd_size / size
+            positions.append(
+                Position(
+                    pair=self.pair_to_ext_pair(position["coin"]),
+                    side=side,
+                    size=size,
+                    usd_size=usd_size,
+                    entry_price=float(position["entryPx"]),
+                    current_price=current_price,
+                    unrealized_pnl=float(position["unrealizedPnl"]),
+                    liquidation_price=float(position["liquidationPx"]),
+                    margin_mode=position["leverage"]["type"],
+                    leverage=position["leverage"]["value"],
+                    hedge_mode=hedge_mode,
+                )
+            )
+
+        return positions
+
+    @invalidates
+    async def _post_action(self, action) -> dict:
+        """ Sign an exchange action and post it, returns the raw response """
+        nonce = int(time.time() * 1000)
+        signature = self._session.sign_l1_action(action, nonce)
+        return await self._session.private_post_exchange(params={
+            "action": action,
+            "nonce": nonce,
+            "signature": signature,
+        })
+
+    def _order_wire(self, pair, side, price, size, type="limit", reduce=False, market_max_spread=0.1) -> dict:
+        if price is None:
+            price = self.market[pair].market_price
+            if not math.isfinite(price) or price <= 0:
+                raise Exception(f"No market price for {pair}, the pair is missing from allMids")
+        if type == "market":
+            if side == "buy":
+                price = price * (1 + market_max_spread)
+            else:
+                price = price * (1 - market_max_spread)
+        return {
+            "a": self.market[pair].coin_index,
+            "b": side == "buy",
+            "p": number_to_str(self.price_to_precision(pair, price)),
+            "s": number_to_str(self.size_to_precision(pair, size)),
+            "r": reduce,
+            "t": {"limit": {"tif": "Gtc"}},
+        }
+
+    async def _post_orders(self, wires) -> list:
+        resp = await self._post_action({
+            "type": "order",
+            "orders": wires,
+            "grouping": "na",
+            "brokerCode": 1,
+        })
+        return resp["response"]["data"]["statuses"]
+
+    async def place_order(
+        self,
+        pair,
+        side,
+        price,
+        size,
+        type="limit",
+        reduce=False,
+        error=True,
+        market_max_spread=0.1,
+    ) -> Order:
+        try:
+            wire = self._order_wire(pair, side, price, size, type, reduce, market_max_spread)
+            status = (await self._post_orders([wire]))[0]
+            if "error" in status:
+                raise Exception(status["error"])
+            order_key = list(status.keys())[0]
+            order = await self.get_order_by_id(status[order_key]["oid"])
+
+            if order_key == "filled":
+                order.price = float(status[order_key]["avgPx"])
+
+            return order
+        except Exception as e:
+            if error:
+                raise e
+            else:
+                print(e)
+                return None
+
+    async def place_orders(self, orders, error=True) -> List[Optional[Order]]:
+        """ Place several orders with a single signed action
+
+            Args:
+                orders(list): dicts of place_order arguments (pair, side,
+                    price, size and optionally type, reduce, market_max_spread)
+                error(bool): raise if the whole request fails, instead of
+                    returning None for every order
+
+            Returns:
+                List[Optional[Order]]: for each order, in order, the order as
+                accepted by the exchange (filled at its average price or
+                resting), or None if it was rejected (the reason is printed)
+        """
+        if len(orders) == 0:
+            return []
+        try:
+            timestamp = int(time.time() * 1000)
+            wires = [self._order_wire(**order) for order in orders]
+            statuses = await self._post_orders(wires)
+        except Exception as e:
+            if error:
+                raise e
+            print(e)
+            return [None] * len(orders)
+
+        results = []
+        for order, wire, status in zip(orders, wires, statuses):
+            if "error" in status:
+                print(f"Error {order['side']} {order['size']} {order['pair']} => {status['error']}")
+                results.append(None)
+                continue
+            order_key = list(status.keys())[0]
+            size = float(wire["s"])
+            filled = float(status["filled"]["totalSz"]) if order_key == "filled" else 0.0
+            price = float(status["filled"]["avgPx"]) if order_key == "filled" else float(wire["p"])
+            results.append(
+                Order(
+                    id=str(status[order_key]["oid"]),
+                    pair=order["pair"],
+                    type=order.get("type", "limit"),
+                    side=order["side"],
+                    price=price,
+                    size=size,
+                    reduce=wire["r"],
+                    filled=filled,
+                    remaining=size - filled,
+                    timestamp=timestamp,
+                )
+            )
+        return results
+
+    @single_flight(copy_result=True)
+    async def get_order_by_id(self, order_id) -> Order:
+        order_id = int(order_id)
+        data = await self._session.publicPostInfo(params={
+            "user": self.public_api,
+            "type": "orderStatus",
+            "oid": order_id,
+        })
+        order = data["order"]["order"]
+        side_map = {
+            "A": "sell",
+            "B": "buy",
+        }
+        return Order(
+            id=str(order_id),
+            pair=self.pair_to_ext_pair(order["coin"]),
+            type=order["orderType"].lower(),
+            side=side_map[order["side"]],
+            price=float(order["limitPx"]),
+            size=float(order["origSz"]),
+            reduce=order["reduceOnly"],
+            filled=float(order["origSz"]) - float(order["sz"]),
+            remaining=float(order["sz"]),
+            timestamp=int(order["timestamp"]),
+        )
+
+    async def cancel_orders(self, pair, ids=[]):
+        results = await self.cancel_orders_by_pair({pair: ids})
+        cancelled = len([result for result in results if result.success])
+        if len(results) == 0 or cancelled < len(results):
+            return Info(success=False, message="Error or no orders to cancel")
+        return Info(success=True, message=f"{cancelled} Orders cancelled")
+
+    async def cancel_trigger_orders(self, pair, ids=[]):
+        results = await self.cancel_orders_by_pair({pair: ids}, trigger=True)
+        cancelled = len([result for result in results if result.success])
+        if len(results) == 0 or cancelled < len(results):
+            return Info(success=False, message="Error or no orders to cancel")
+        return Info(success=True, message=f"{cancelled} Trigger Orders cancelled")
+
+    async def cancel_orders_by_pair(
+        self, ids_by_pair: Dict[str, List[str]], trigger=False, all_listed=False
+    ) -> List[CancelResult]:
+        """ Cancel the given order ids (limit or trigger) of several pairs in
+            a single signed cancel action, trigger orders are cancelled like
+            the others (trigger and all_listed are kept for the PerpBitget
+            and PerpBitmart signature)
+
+            Returns:
+                List[CancelResult]: the outcome of every order
+        """
+        orders = [(pair, order_id) for pair, ids in ids_by_pair.items() for order_id in ids]
+        if len(orders) == 0:
+            return []
+        try:
+            resp = await self._post_action({
+                "type": "cancel",
+                "cancels": [
+                    {"a": self.market[pair].coin_index, "o": int(order_id)}
+                    for pair, order_id in orders
+                ],
+            })
+            statuses = resp["response"]["data"]["statuses"]
+        except Exception as e:
+            return [
+                CancelResult(id=str(order_id), pair=pair, success=False, message=str(e))
+                for pair, order_id in orders
+            ]
+        results = []
+        for (pair, order_id), status in zip(orders, statuses):
+            success = status == "success"
+            message = "Cancelled" if success else str(status.get("error", status) if isinstance(status, dict) else status)
+            results.append(CancelResult(id=str(order_id), pair=pair, success=success, message=message))
+        return results
@@ -0,0 +1,64 @@
+import hashlib
+import json
+import os
+import time
+
+
+class LeverageCache:
+    """ Last confirmed margin mode and leverage per pair, persisted to disk
+
+        Lets the adapters skip set_margin_mode_and_leverage calls when the
+        exchange already holds the requested configuration.
+
+        Args:
+            path(str): json file shared by every account
+            account(str): public api key of the account, the file only holds
+                a hash of it
+            ttl(int): seconds after which an entry is considered stale
+    """
+
+    def __init__(self, path: str, account: str, ttl: int = 24 * 60 * 60):
+        self.path = path
+        self.account = hashlib.sha256(account.encode()).hexdigest()[:16] if account else "public"
+        self.ttl = ttl
+        self._entries = self._load().get(self.account, {})
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def is_set(self, pair: str, margin_mode: str, leverage) -> bool:
+        entry = self._entries.get(pair)
+        return (
+            entry is not None
+            and entry["margin_mode"] == margin_mode
+            and entry["leverage"] == leverage
+            and time.time() - entry["timestamp"] < self.ttl
+        )
+
+    def confirm(self, pair: str, margin_mode: str, leverage):
+        self._entries[pair] = {
+            "margin_mode": margin_mode,
+            "leverage": leverage,
+            "timestamp": int(time.time()),
+        }
+        self._save()
+
+    def invalidate(self, pair: str):
+        if self._entries.pop(pair, None) is not None:
+            self._save()
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # reload so entries written meanwhile for other accounts are kept
+        data = self._load()
+        data[self.account] = self._entries
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,236 @@
+import asyncio
+import time
+import pandas as pd
+from ccxt.async_support.base.throttler import Throttler
+from ccxt.async_support.base.ws.aiohttp_client import AiohttpClient
+from utilities.ohlcv_chunks import ohlcv_frame
+from utilities.state_book import StateBook
+
+
+class LiveView:
+    """ Last known candles, tickers, positions and orders of one exchange
+        session, kept up to date by an ExchangeStream
+
+        Candles are kept per (pair, timeframe), pairs being the adapter ones
+        ("BTC/USDT"), positions and open orders in a StateBook (self.book).
+        A candle is closed once a candle with a later open date is received:
+        on_candle_close callbacks and wait_candle_close() waiters are then
+        called with the closed candle [date, open, high, low, close, volume].
+    """
+
+    def __init__(self, max_candles=1000):
+        self.max_candles = max_candles
+        self.candles = {}
+        self.tickers = {}
+        self.book = StateBook()
+        self.updated_at = {}
+        self._candle_close_callbacks = []
+        self._candle_close_waiters = {}
+
+    def on_candle_close(self, callback):
+        """ callback(pair, timeframe, candle), called from the stream task """
+        self._candle_close_callbacks.append(callback)
+
+    async def wait_candle_close(self, pair, timeframe) -> list:
+        future = asyncio.get_running_loop().create_future()
+        self._candle_close_waiters.setdefault((pair, timeframe), []).append(future)
+        return await future
+
+    def update_candles(self, pair, timeframe, rows):
+        key = (pair, timeframe)
+        candles = self.candles.setdefault(key, {})
+        for row in sorted(rows, key=lambda row: row[0]):
+            last_ts = next(reversed(candles)) if len(candles) > 0 else None
+            if last_ts is not None and row[0] < last_ts:
+                continue
+            if last_ts is not None and row[0] > last_ts:
+                self._candle_closed(pair, timeframe, candles[last_ts])
+            candles[row[0]] = list(row[:6])
+        while len(candles) > self.max_candles:
+            del candles[next(iter(candles))]
+        self.updated_at[("candles", pair, timeframe)] = time.time()
+
+    def _candle_closed(self, pair, timeframe, candle):
+        for callback in self._candle_close_callbacks:
+            callback(pair, timeframe, candle)
+        for future in self._candle_close_waiters.pop((pair, timeframe), []):
+            if not future.done():
+                future.set_result(candle)
+
+    def update_ticker(self, pair, ticker):
+        self.tickers[pair] = ticker
+        self.updated_at[("ticker", pair)] = time.time()
+
+    def update_positions(self, positions, snapshot=False):
+        self.book.update_positions(positions, snapshot)
+
+    def update_order(self, order, is_open):
+        self.book.update_order(order, is_open)
+
+    @property
+    def positions(self) -> dict:
+        return self.book.positions
+
+    @property
+    def orders(self) -> dict:
+        return self.book.orders
+
+    def ohlcv(self, pair, timeframe, closed_only=False) -> pd.DataFrame:
+        """ Same columns and index as get_last_ohlcv """
+        rows = list(self.candles.get((pair, timeframe), {}).values())
+        if closed_only:
+            rows = rows[:-1]
+        return ohlcv_frame(rows)
+
+    def last_closed_candle(self, pair, timeframe) -> list:
+        rows = list(self.candles.get((pair, timeframe), {}).values())
+        return rows[-2] if len(rows) > 1 else None
+
+    def mark_price(self, pair) -> float:
+        ticker = self.tickers.get(pair)
+        if ticker is None:
+            return None
+        return ticker.get("markPrice") or ticker["last"]
+
+
+def aiohttp_ws_client(ws_session, url):
+    """ ccxt pro client of url built on AiohttpClient, which reads through
+        the public aiohttp WebSocket API (ws_connect / receive), instead of
+        FastClient, which needs aiohttp internals removed in aiohttp 3.11
+        (WebSocketReader.parse_frame)
+    """
+    ws_session.clients = ws_session.clients or {}
+    if url not in ws_session.clients:
+        options = ws_session.extend(ws_session.streaming, {
+            "log": getattr(ws_session, "log"),
+            "ping": getattr(ws_session, "ping", None),
+            "verbose": ws_session.verbose,
+            "throttle": Throttler(ws_session.tokenBucket, ws_session.asyncio_loop),
+            "asyncio_loop": ws_session.asyncio_loop,
+        }, ws_session.safe_value(ws_session.options, "ws", {}))
+        client = AiohttpClient(
+            url,
+            ws_session.handle_message,
+            ws_session.on_error,
+            ws_session.on_close,
+            ws_session.on_connected,
+            options,
+        )
+        client.proxy = ws_session.get_ws_proxy()
+        ws_session.clients[url] = client
+    return ws_session.clients[url]
+
+
+class ExchangeStream:
+    """ Feeds a LiveView from a ccxt pro session (watch_ohlcv, watch_ticker,
+        watch_positions, watch_orders), one task per subscription
+
+        A failing subscription is retried with an exponential delay (ccxt
+        reconnects on the next watch call), the other ones keep running.
+
+        Args:
+            ws_session: ccxt pro session, markets loaded or set
+            view(LiveView): state to update
+            symbol_to_pair: ccxt symbol to adapter pair
+            parse_position / parse_order: ccxt position or order to adapter
+                record, needed for the private subscriptions
+            positions_snapshot(bool): every positions update lists all the
+                open positions (Bitget), missing ones are closed
+    """
+
+    def __init__(
+        self,
+        ws_session,
+        view,
+        symbol_to_pair,
+        parse_position=None,
+        parse_order=None,
+        parse_trigger_order=None,
+        positions_snapshot=False,
+        retry_delay=1,
+        max_retry_delay=30,
+    ):
+        ws_session.client = lambda url: aiohttp_ws_client(ws_session, url)
+        self.ws_session = ws_session
+        self.view = view
+        self.symbol_to_pair = symbol_to_pair
+        self.parse_position = parse_position
+        self.parse_order = parse_order
+        self.parse_trigger_order = parse_trigger_order
+        self.positions_snapshot = positions_snapshot
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._tasks = []
+
+    def start(self, symbols, timeframes=[], tickers=True, positions=False, orders=False):
+        has = self.ws_session.has
+        for symbol in symbols:
+            pair = self.symbol_to_pair(symbol)
+            for timeframe in timeframes:
+                self._spawn(
+                    f"ohlcv {pair} {timeframe}",
+                    lambda symbol=symbol, timeframe=timeframe: self.ws_session.watch_ohlcv(symbol, timeframe),
+                    lambda rows, pair=pair, timeframe=timeframe: self.view.update_candles(pair, timeframe, rows),
+                )
+            if tickers:
+                self._spawn(
+                    f"ticker {pair}",
+                    lambda symbol=symbol: self.ws_session.watch_ticker(symbol),
+                    lambda ticker, pair=pair: self.view.update_ticker(pair, ticker),
+                )
+        if positions:
+            if has.get("watchPositions") and self.parse_position is not None:
+                self._spawn("positions", lambda: self.ws_session.watch_positions(), self._handle_positions)
+            else:
+                print(f"Positions stream not available on {self.ws_session.id}")
+        if orders:
+            if has.get("watchOrders") and self.parse_order is not None:
+                self._spawn("orders", lambda: self.ws_session.watch_orders(), self._handle_orders(self.parse_order))
+                if self.parse_trigger_order is not None:
+                    self._spawn(
+                        "trigger orders",
+                        lambda: self.ws_session.watch_orders(params={"stop": True}),
+                        self._handle_orders(self.parse_trigger_order),
+                    )
+            else:
+                print(f"Orders stream not available on {self.ws_session.id}")
+
+    def _spawn(self, name, watch, handle):
+        self._tasks.append(asyncio.ensure_future(self._watch(name, watch, handle)))
+
+    async def _watch(self, name, watch, handle):
+        delay = self.retry_delay
+        while True:
+            try:
+                data = await watch()
+                delay = self.retry_delay
+                handle(data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Stream {name} failed, retrying in {delay}s - Error => {str(e)}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+
+    def _handle_positions(self, positions):
+        parsed = []
+        for position in positions:
+            # the private streams may not send the mark price, take the ticker one
+            if not position.get("markPrice"):
+                mark_price = self.view.mark_price(self.symbol_to_pair(position["symbol"]))
+                position = dict(position, markPrice=mark_price if mark_price is not None else position["entryPrice"])
+            parsed.append(self.parse_position(position))
+        self.view.update_positions(parsed, snapshot=self.positions_snapshot)
+
+    def _handle_orders(self, parse):
+        def handle(orders):
+            for order in orders:
+                self.view.update_order(parse(order), order["status"] == "open")
+        return handle
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.ws_session.close()
@@ -0,0 +1,43 @@
+import asyncio
+import fcntl
+import json
+import os
+
+# directory shared by the strategy processes of one orchestrator run
+MARKETS_DIR_ENV = "LIVE_TOOLS_MARKETS_DIR"
+
+
+async def load_markets_shared(session) -> dict:
+    """ session.load_markets(), loaded once per exchange for every process
+        started with the LIVE_TOOLS_MARKETS_DIR variable (set by
+        strategies/run_strategies.py for the run)
+
+        The first process loading an exchange writes its markets and
+        currencies to {dir}/{exchange id}.json, the others wait for it
+        (file lock) and set them on their session without any request.
+        Without the variable it is a plain load_markets().
+    """
+    directory = os.environ.get(MARKETS_DIR_ENV)
+    if not directory:
+        return await session.load_markets()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{session.id}.json")
+    with open(f"{path}.lock", "a") as lock:
+        # blocking lock taken in a thread, the event loop keeps running
+        await asyncio.to_thread(fcntl.flock, lock.fileno(), fcntl.LOCK_EX)
+        try:
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+                session.set_markets(data["markets"], data["currencies"])
+                return session.markets
+            except (OSError, ValueError, KeyError):
+                pass
+            markets = await session.load_markets()
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"markets": session.markets, "currencies": session.currencies}, f)
+            os.replace(tmp_path, path)
+            return markets
+        finally:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
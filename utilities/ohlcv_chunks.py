@@ -0,0 +1,111 @@
+import asyncio
+import random
+import ccxt.async_support as ccxt
+import pandas as pd
+
+OHLCV_COLUMNS = ["date", "open", "high", "low", "close", "volume"]
+
+
+class OhlcvFetchError(Exception):
+    """ Some chunks still failed after their retries
+
+        Attributes:
+            partial(pd.DataFrame): candles of the chunks fetched
+            missing(list): (start_ts, end_ts) of the chunks not fetched
+            chunks(list): every chunk requested
+            fetched(dict): ccxt rows by chunk fetched, to resume with
+                fetch_ohlcv_chunks(fetch_chunk, e.chunks, fetched=e.fetched)
+    """
+
+    def __init__(self, message, partial, missing, chunks=None, fetched=None):
+        super().__init__(message)
+        self.partial = partial
+        self.missing = missing
+        self.chunks = chunks if chunks is not None else []
+        self.fetched = fetched if fetched is not None else {}
+
+
+def ohlcv_chunks(start_ts, end_ts, chunk_ms) -> list:
+    """ (start_ts, end_ts) ranges of chunk_ms covering start_ts to end_ts,
+        each one starting 1 ms after the end of the previous one
+    """
+    chunks = []
+    current_ts = start_ts
+    while current_ts < end_ts:
+        chunk_end_ts = min(current_ts + chunk_ms, end_ts)
+        chunks.append((current_ts, chunk_end_ts))
+        current_ts = chunk_end_ts + 1
+    return chunks
+
+
+def ohlcv_frame(rows) -> pd.DataFrame:
+    """ DataFrame indexed by candle open date from ccxt OHLCV rows, the
+        candles returned by two chunks (shared boundary) are kept once
+    """
+    df = pd.DataFrame(rows, columns=OHLCV_COLUMNS)
+    df = df.drop_duplicates(subset="date", keep="last")
+    df = df.set_index(df["date"])
+    df.index = pd.to_datetime(df.index, unit="ms")
+    df = df.sort_index()
+    del df["date"]
+    return df
+
+
+async def fetch_ohlcv_chunks(
+    fetch_chunk,
+    chunks,
+    retries=3,
+    base_delay=0.5,
+    max_delay=8,
+    retry_on=(ccxt.NetworkError, asyncio.TimeoutError),
+    fetched=None,
+) -> pd.DataFrame:
+    """ Fetch every chunk concurrently, each one retried on its own
+
+        A chunk failing with a retry_on error (timeouts, rate limits,
+        unavailable exchange) is requested again after a random delay of
+        up to base_delay x 2^attempt seconds (capped at max_delay), the
+        chunks already fetched are kept and never requested again. Other
+        errors are not retried.
+
+        Args:
+            fetch_chunk: coroutine function (start_ts, end_ts) -> ccxt rows
+            chunks(list): (start_ts, end_ts) ranges, see ohlcv_chunks
+            fetched(dict): ccxt rows by chunk already fetched (fetched of
+                a previous OhlcvFetchError), only the other chunks are
+                requested
+
+        Raises:
+            OhlcvFetchError: when chunks are still missing, with the
+                candles of the others
+    """
+    rows = dict(fetched) if fetched is not None else {}
+    errors = {}
+
+    async def fetch(chunk):
+        for attempt in range(retries + 1):
+            try:
+                rows[chunk] = await fetch_chunk(*chunk)
+                return
+            except retry_on as e:
+                errors[chunk] = e
+                if attempt == retries:
+                    return
+                await asyncio.sleep(random.uniform(0, min(max_delay, base_delay * 2**attempt)))
+            except Exception as e:
+                errors[chunk] = e
+                return
+
+    await asyncio.gather(*[fetch(chunk) for chunk in chunks if chunk not in rows])
+    df = ohlcv_frame([row for chunk in chunks if chunk in rows for row in rows[chunk]])
+    missing = [chunk for chunk in chunks if chunk not in rows]
+    if len(missing) > 0:
+        first_error = errors[missing[0]]
+        raise OhlcvFetchError(
+            f"{len(missing)}/{len(chunks)} OHLCV chunks failed - Error => {str(first_error)}",
+            df,
+            missing,
+            chunks,
+            {chunk: rows[chunk] for chunk in chunks if chunk in rows},
+        ) from first_error
+    return df
@@ -0,0 +1,156 @@
+import asyncio
+
+
+async def execute_orders(exchange, order_requests, max_concurrency=5) -> list:
+    """ Submit a batch of place_order calls concurrently
+
+        Every request runs in parallel, bounded by a semaphore, except that
+        on a given pair the opening orders are only sent once its reduce-only
+        (closing) orders are done. An opening request is skipped when a
+        closing request of the same key failed. For netted requests (see
+        net_order_requests) the keys are the ones of the members: an opening
+        request is netted again without the members of those keys, which
+        are moved under "dropped".
+
+        Args:
+            exchange: adapter exposing place_order(**params)
+            order_requests(list): dicts with "key", "pair" and "params", the
+                place_order keyword arguments
+            max_concurrency(int): maximum number of orders in flight
+
+        Returns:
+            list: for each request, in order, the Order returned by the
+            exchange, the exception raised, or None if it was skipped or had
+            nothing to send (size of 0)
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    results = [None] * len(order_requests)
+    by_pair = {}
+    for index, request in enumerate(order_requests):
+        by_pair.setdefault(request["pair"], []).append(index)
+
+    async def place(index):
+        if order_requests[index]["params"]["size"] == 0:
+            return
+        async with semaphore:
+            try:
+                results[index] = await exchange.place_order(**order_requests[index]["params"])
+            except Exception as e:
+                results[index] = e
+
+    async def run_pair(indexes):
+        closes = [i for i in indexes if order_requests[i]["params"].get("reduce", False)]
+        opens = [i for i in indexes if i not in closes]
+        await asyncio.gather(*[place(i) for i in closes])
+        failed_keys = set()
+        for i in closes:
+            if results[i] is None or isinstance(results[i], Exception):
+                failed_keys.update(request_keys(order_requests[i]))
+        sendable = []
+        for i in opens:
+            request = order_requests[i]
+            if "members" in request and failed_keys & request_keys(request):
+                renet(request, failed_keys)
+            if failed_keys.isdisjoint(request_keys(request)):
+                sendable.append(i)
+        await asyncio.gather(*[place(i) for i in sendable])
+
+    await asyncio.gather(*[run_pair(indexes) for indexes in by_pair.values()])
+    return results
+
+
+def request_keys(request) -> set:
+    """ Strategy keys of a request, the ones of its members once netted """
+    if "members" in request:
+        return set(member["key"] for member in request["members"])
+    return {request["key"]}
+
+
+def renet(net_request, excluded_keys):
+    """ Net a request again, in place, without the members of excluded_keys
+        (kept under "dropped"), its size is 0 when no member is left
+    """
+    members = [m for m in net_request["members"] if m["key"] not in excluded_keys]
+    net_request["dropped"] = net_request.get("dropped", []) + [
+        m for m in net_request["members"] if m["key"] in excluded_keys
+    ]
+    if len(members) == 0:
+        net_request["members"] = []
+        net_request["params"] = dict(net_request["params"], size=0)
+        net_request["capped"] = False
+        return
+    netted = net_order_requests(members)[0]
+    net_request.update(params=netted["params"], capped=netted["capped"], members=members)
+
+
+def net_order_requests(order_requests) -> list:
+    """ Merge the requests of every key trading the same pair and position
+        side into a single order
+
+        A close (reduce) request counts as a negative delta on the position,
+        an open request as a positive one. The net delta decides the side,
+        size and reduce flag of the merged order, a reduce order being capped
+        to the smallest "max_reduce" given by its members. Pairs whose deltas
+        cancel out produce a request with a size of 0 and nothing to send.
+
+        Args:
+            order_requests(list): execute_orders requests, with "side" the
+                position side ("long" or "short") and optionally "max_reduce"
+
+        Returns:
+            list: one request per pair and side, its original requests under
+            "members"
+    """
+    groups = {}
+    for request in order_requests:
+        groups.setdefault((request["pair"], request["side"]), []).append(request)
+
+    net_requests = []
+    for (pair, side), members in groups.items():
+        delta = sum(
+            -m["params"]["size"] if m["params"]["reduce"] else m["params"]["size"]
+            for m in members
+        )
+        reduce = delta < 0
+        size = abs(delta)
+        max_reduce = min([m["max_reduce"] for m in members if "max_reduce" in m], default=None)
+        capped = reduce and max_reduce is not None and max_reduce < size
+        if capped:
+            size = max_reduce
+        buy = (side == "long") != reduce
+        params = dict(members[0]["params"])
+        params.update({"side": "buy" if buy else "sell", "size": size, "reduce": reduce})
+        net_requests.append({
+            "key": f"{pair}-{side}",
+            "pair": pair,
+            "side": side,
+            "params": params,
+            "capped": capped,
+            "members": members,
+        })
+    return net_requests
+
+
+def allocate_fill(net_request, filled) -> list:
+    """ Split the filled size of a netted order back to its members
+
+        Opposite members are matched against each other first, the exchange
+        fill is then shared pro rata between the members of the net direction.
+        A reduce order capped to the whole exchange position closes every
+        member once it is filled.
+
+        Returns:
+            list: (member request, allocated size) in member order
+    """
+    members = net_request["members"]
+    open_total = sum(m["params"]["size"] for m in members if not m["params"]["reduce"])
+    close_total = sum(m["params"]["size"] for m in members if m["params"]["reduce"])
+    open_ratio = close_ratio = 1
+    if open_total > close_total:
+        open_ratio = min(1, (close_total + filled) / open_total)
+    elif close_total > open_total and not (net_request["capped"] and filled >= net_request["params"]["size"]):
+        close_ratio = min(1, (open_total + filled) / close_total)
+    return [
+        (m, m["params"]["size"] * (close_ratio if m["params"]["reduce"] else open_ratio))
+        for m in members
+    ]
@@ -0,0 +1,154 @@
+import math
+from decimal import Decimal, ROUND_DOWN
+import numpy as np
+from ccxt.base.decimal_to_precision import decimal_to_precision, ROUND, TICK_SIZE
+
+# absorbs float noise before flooring, 0.3 / 0.1 = 2.9999999999999996
+FLOOR_EPSILON = 1e-9
+
+
+
+def step_decimals(step: float) -> int:
+    """ Number of decimals of a tick or lot size (0.005 -> 3, 5 -> 0) """
+    exponent = Decimal(str(step)).normalize().as_tuple().exponent
+    return max(0, -exponent)
+
+
+class PrecisionTable:
+    """ Tick size, lot size and minimums of every market, column-wise
+
+        Built once from ccxt load_markets() (TICK_SIZE precision mode, as
+        on Bitget and Bitmart), it replaces ccxt's string based
+        price_to_precision / amount_to_precision with float arithmetic:
+        prices are rounded to the nearest tick and amounts truncated to the
+        lot size, like ccxt does. Amounts are in the market amount unit,
+        contracts when the contract size is not 1.
+
+        Every method takes one pair and one value, or arrays of pairs and
+        values to round a whole batch of orders in one vectorized pass.
+        Prices halfway between two ticks (within float noise, 2.675 / 0.01 =
+        267.49999999999997) are rounded by ccxt's decimal_to_precision
+        itself: it compares the Decimal remainder with the float tick / 2,
+        so ties go up with a 0.5 tick but down with 0.01 (2.675 -> 2.67),
+        which neither round() (ties to even) nor a floor(x + 0.5) follows.
+        With exact=True every value is rounded that way (Decimal for the
+        amounts).
+    """
+
+    def __init__(self, pairs, tick_sizes, lot_sizes, min_amounts, min_notionals, contract_sizes):
+        self.pairs = list(pairs)
+        self.index = {pair: i for i, pair in enumerate(self.pairs)}
+        self.tick_sizes = np.asarray(tick_sizes, dtype=np.float64)
+        self.lot_sizes = np.asarray(lot_sizes, dtype=np.float64)
+        self.min_amounts = np.asarray(min_amounts, dtype=np.float64)
+        self.min_notionals = np.asarray(min_notionals, dtype=np.float64)
+        self.contract_sizes = np.asarray(contract_sizes, dtype=np.float64)
+        self.price_decimals = np.array([step_decimals(step) for step in self.tick_sizes], dtype=np.int8)
+        self.amount_decimals = np.array([step_decimals(step) for step in self.lot_sizes], dtype=np.int8)
+        # plain python rows for single values, numpy scalars are slower there
+        self._rows = list(zip(
+            self.tick_sizes.tolist(),
+            self.lot_sizes.tolist(),
+            self.price_decimals.tolist(),
+            self.amount_decimals.tolist(),
+        ))
+
+    @classmethod
+    def from_markets(cls, markets, symbol_to_pair=None):
+        """ Args:
+                markets(dict): ccxt markets, by symbol
+                symbol_to_pair: maps a ccxt symbol to the pair name used as
+                    key, the symbol itself by default
+        """
+        rows = []
+        for symbol, market in markets.items():
+            precision = market.get("precision") or {}
+            if precision.get("price") is None or precision.get("amount") is None:
+                continue
+            limits = market.get("limits") or {}
+            rows.append((
+                symbol_to_pair(symbol) if symbol_to_pair is not None else symbol,
+                precision["price"],
+                precision["amount"],
+                (limits.get("amount") or {}).get("min") or 0,
+                (limits.get("cost") or {}).get("min") or 0,
+                market.get("contractSize") or 1,
+            ))
+        return cls(*zip(*rows)) if len(rows) > 0 else cls([], [], [], [], [], [])
+
+    def __contains__(self, pair) -> bool:
+        return pair in self.index
+
+    def indexes(self, pairs) -> np.ndarray:
+        return np.array([self.index[pair] for pair in pairs], dtype=np.intp)
+
+    def price_to_precision(self, pair, price, exact=False):
+        """ Nearest tick, a float for one pair or an array for many """
+        if isinstance(pair, str):
+            tick, _, decimals, _ = self._rows[self.index[pair]]
+            steps = price / tick
+            if exact or abs(steps - math.floor(steps) - 0.5) < FLOOR_EPSILON:
+                return self._ccxt_price(price, tick)
+            return round(round(steps) * tick, decimals)
+        indexes = self.indexes(pair)
+        ticks = self.tick_sizes[indexes]
+        if exact:
+            return np.array([self._ccxt_price(p, t) for p, t in zip(price, ticks.tolist())])
+        price = np.asarray(price, dtype=np.float64)
+        steps = price / ticks
+        result = self._round_decimals(np.round(steps) * ticks, self.price_decimals[indexes])
+        for i in np.flatnonzero(np.abs(steps - np.floor(steps) - 0.5) < FLOOR_EPSILON):
+            result[i] = self._ccxt_price(float(price[i]), float(ticks[i]))
+        return result
+
+    def amount_to_precision(self, pair, amount, exact=False):
+        """ Truncated to the lot size, a float for one pair or an array
+            for many
+        """
+        if isinstance(pair, str):
+            _, lot, _, decimals = self._rows[self.index[pair]]
+            if exact:
+                return self._exact(amount, lot, ROUND_DOWN)
+            return round(math.floor(amount / lot + FLOOR_EPSILON) * lot, decimals)
+        indexes = self.indexes(pair)
+        if exact:
+            return np.array([self._exact(a, self.lot_sizes[i], ROUND_DOWN) for a, i in zip(amount, indexes)])
+        lots = self.lot_sizes[indexes]
+        return self._round_decimals(
+            np.floor(np.asarray(amount, dtype=np.float64) / lots + FLOOR_EPSILON) * lots,
+            self.amount_decimals[indexes],
+        )
+
+    def meets_minimums(self, pair, price, amount):
+        """ True where the amount and its notional (amount x contract size x
+            price) reach the market minimums
+        """
+        if isinstance(pair, str):
+            i = self.index[pair]
+            return bool(
+                amount >= self.min_amounts[i]
+                and amount * self.contract_sizes[i] * price >= self.min_notionals[i]
+            )
+        indexes = self.indexes(pair)
+        amount = np.asarray(amount, dtype=np.float64)
+        notional = amount * self.contract_sizes[indexes] * np.asarray(price, dtype=np.float64)
+        return (amount >= self.min_amounts[indexes]) & (notional >= self.min_notionals[indexes])
+
+    @staticmethod
+    def _ccxt_price(price, tick) -> float:
+        return float(decimal_to_precision(price, ROUND, tick, TICK_SIZE))
+
+    @staticmethod
+    def _exact(value, step, rounding) -> float:
+        step = Decimal(str(step))
+        steps = (Decimal(str(value)) / step).to_integral_value(rounding=rounding)
+        return float(steps * step)
+
+    @staticmethod
+    def _round_decimals(values, decimals) -> np.ndarray:
+        # np.round takes a single decimals value, group by it (a few groups)
+        result = np.empty_like(values)
+        for d in np.unique(decimals):
+            mask = decimals == d
+            result[mask] = np.round(values[mask], int(d))
+        return result
@@ -0,0 +1,191 @@
+import asyncio
+import atexit
+import contextvars
+import gzip
+import json
+import os
+import time
+import urllib.parse
+from aiohttp import web
+
+# request fields changing on every run (clock, signatures), ignored when
+# matching a replayed request against the cassette
+VOLATILE_KEYS = {
+    "startTime", "endTime", "start_time", "end_time", "since", "until",
+    "timestamp", "requestTime", "recvWindow", "nonce", "signature", "sign",
+}
+REPLAY_URL_HEADER = "X-Replay-Url"
+
+_request_start = contextvars.ContextVar("request_start", default=None)
+
+
+def _strip_volatile(value):
+    if isinstance(value, dict):
+        return {k: _strip_volatile(v) for k, v in sorted(value.items()) if k not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_strip_volatile(v) for v in value]
+    return value
+
+
+def request_key(method, url, body) -> str:
+    """ Identity of a request, without its volatile fields """
+    parts = urllib.parse.urlsplit(url)
+    query = sorted(
+        (k, v) for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if k not in VOLATILE_KEYS
+    )
+    if body:
+        try:
+            body = json.dumps(_strip_volatile(json.loads(body)), sort_keys=True)
+        except ValueError:
+            pass
+    return f"{method} {parts.netloc}{parts.path}?{urllib.parse.urlencode(query)} {body or ''}"
+
+
+class ExchangeRecorder:
+    """ Record the HTTP traffic of ccxt async sessions to a cassette, or
+        replay it with no network
+
+        In record mode every response (status, body, latency) is kept and
+        save() writes them as gzipped JSON lines. In replay mode requests
+        are sent to a local aiohttp server which answers from the cassette:
+        the exchange responses go through the same HTTP client, parsing and
+        error handling as live ones. Identical requests are answered in
+        their recorded order, the last answer being repeated once exhausted.
+
+        Args:
+            path(str): cassette file (.jsonl.gz)
+            mode(str): "record" or "replay"
+            latency_scale(float): replay only, each response is delayed by
+                its recorded latency times this factor (0 for no delay)
+    """
+
+    def __init__(self, path, mode="record", latency_scale=0.0):
+        if mode not in ["record", "replay"]:
+            raise Exception("Mode must be either 'record' or 'replay'")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.entries = []
+        self._served = {}
+        self._by_key = {}
+        self._runner = None
+        self._port = None
+        self._lock = None
+        if mode == "replay":
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                self.entries = [json.loads(line) for line in f]
+            for entry in self.entries:
+                self._by_key.setdefault(entry["key"], []).append(entry)
+
+    def attach(self, session):
+        """ Record or replay the requests of a ccxt async session, in place """
+        original_fetch = session.fetch
+        if self.mode == "record":
+            original_on_rest_response = session.on_rest_response
+
+            async def fetch(url, method="GET", headers=None, body=None):
+                token = _request_start.set(time.perf_counter())
+                try:
+                    return await original_fetch(url, method, headers, body)
+                finally:
+                    _request_start.reset(token)
+
+            def on_rest_response(code, reason, url, method, headers, body, request_headers, request_body):
+                start = _request_start.get()
+                self.entries.append({
+                    "key": request_key(method, url, request_body),
+                    "url": url,
+                    "status": code,
+                    "content_type": headers.get("Content-Type", "application/json"),
+                    "body": body,
+                    "latency": time.perf_counter() - start if start is not None else 0,
+                })
+                return original_on_rest_response(
+                    code, reason, url, method, headers, body, request_headers, request_body
+                )
+
+            session.on_rest_response = on_rest_response
+        else:
+            async def fetch(url, method="GET", headers=None, body=None):
+                await self.start()
+                headers = dict(headers or {})
+                headers[REPLAY_URL_HEADER] = url
+                return await original_fetch(f"http://127.0.0.1:{self._port}/", method, headers, body)
+
+        session.fetch = fetch
+        return session
+
+    async def start(self):
+        """ Start the local replay server (done by the first request) """
+        if self.mode != "replay" or self._runner is not None:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._runner is not None:
+                return
+            app = web.Application()
+            app.router.add_route("*", "/{tail:.*}", self._handle)
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            self._port = site._server.sockets[0].getsockname()[1]
+            self._runner = runner
+
+    async def _handle(self, request):
+        key = request_key(request.method, request.headers[REPLAY_URL_HEADER], await request.text())
+        entries = self._by_key.get(key)
+        if entries is None:
+            return web.json_response({"code": "replay", "msg": f"Not in cassette: {key}"}, status=404)
+        served = self._served.get(key, 0)
+        self._served[key] = served + 1
+        entry = entries[min(served, len(entries) - 1)]
+        if self.latency_scale > 0:
+            await asyncio.sleep(entry["latency"] * self.latency_scale)
+        return web.Response(
+            status=entry["status"],
+            body=(entry["body"] or "").encode("utf-8"),
+            headers={"Content-Type": entry["content_type"]},
+        )
+
+    def save(self):
+        if self.mode != "record":
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            for entry in self.entries:
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.path)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        self.save()
+
+
+_env_recorder = None
+
+
+def attach_from_env(session):
+    """ Record or replay a session when the LIVE_TOOLS_CASSETTE variable is
+        set (LIVE_TOOLS_CASSETTE_MODE: record or replay, the default, and
+        LIVE_TOOLS_LATENCY_SCALE), shared by every session of the process
+    """
+    global _env_recorder
+    path = os.environ.get("LIVE_TOOLS_CASSETTE")
+    if not path:
+        return session
+    if _env_recorder is None:
+        _env_recorder = ExchangeRecorder(
+            path,
+            mode=os.environ.get("LIVE_TOOLS_CASSETTE_MODE", "replay"),
+            latency_scale=float(os.environ.get("LIVE_TOOLS_LATENCY_SCALE", 0)),
+        )
+        atexit.register(_env_recorder.save)
+    return _env_recorder.attach(session)
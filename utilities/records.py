@@ -0,0 +1,25 @@
+import dataclasses
+import pandas as pd
+
+
+def records_table(records, record_type=None) -> pd.DataFrame:
+    """ Columnar table of adapter records (Order, TriggerOrder, Position...)
+
+        One column per record field and one row per record, built column by
+        column, e.g. to aggregate the orders or positions of many accounts.
+
+        Args:
+            records(list): records of a single type
+            record_type: their dataclass, needed to get the columns of an
+                empty list
+    """
+    if record_type is None:
+        if len(records) == 0:
+            return pd.DataFrame()
+        record_type = type(records[0])
+    return pd.DataFrame(
+        {
+            field.name: [getattr(record, field.name) for record in records]
+            for field in dataclasses.fields(record_type)
+        }
+    )
@@ -0,0 +1,97 @@
+import asyncio
+import copy
+import functools
+import time
+
+# seconds a read result is served again without a request, unless a write
+# of the same adapter happens first
+READ_MEMO_TTL = 5
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+class SingleFlight:
+    """ Identical concurrent calls share one execution, and its result can
+        be kept a few seconds for the calls made right after
+
+        Calls are identified by a hashable key. An exception is passed to
+        every caller waiting for it and never kept. invalidate() drops the
+        kept results and detaches the calls in flight, whose results are
+        then returned to their callers but not kept.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self._memo = {}
+        self._generation = 0
+
+    async def run(self, key, factory, ttl=0):
+        memo = self._memo.get(key)
+        if memo is not None:
+            if memo[0] > time.monotonic():
+                return memo[1]
+            del self._memo[key]
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._execute(key, factory, ttl))
+            self._in_flight[key] = future
+        # a cancelled caller must not cancel the call shared with the others
+        return await asyncio.shield(future)
+
+    async def _execute(self, key, factory, ttl):
+        generation = self._generation
+        try:
+            result = await factory()
+            if ttl > 0 and generation == self._generation:
+                self._memo[key] = (time.monotonic() + ttl, result)
+            return result
+        finally:
+            if generation == self._generation:
+                self._in_flight.pop(key, None)
+
+    def invalidate(self):
+        self._generation += 1
+        self._in_flight = {}
+        self._memo = {}
+
+
+def single_flight(ttl=0, copy_result=False):
+    """ Adapter method decorator, calls with the same arguments go through
+        the adapter's SingleFlight (self._flight)
+
+        Args:
+            ttl(float): seconds the result is kept, 0 to only share the
+                calls in flight
+            copy_result(bool): give every caller its own deep copy, for
+                results callers may modify (DataFrames, lists of records)
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            key = (method.__name__, _freeze(args), _freeze(kwargs))
+            result = await self._flight.run(key, lambda: method(self, *args, **kwargs), ttl)
+            return copy.deepcopy(result) if copy_result else result
+        return wrapper
+    return decorator
+
+
+def invalidates(method):
+    """ Adapter method decorator for writes (orders, cancels, leverage),
+        the reads kept or in flight are not reused after it
+    """
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        self._flight.invalidate()
+        try:
+            return await method(self, *args, **kwargs)
+        finally:
+            self._flight.invalidate()
+    return wrapper
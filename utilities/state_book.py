@@ -0,0 +1,159 @@
+import asyncio
+import itertools
+import time
+
+# side of the position an order opens (reduce=False) or reduces (reduce=True)
+POSITION_SIDE = {
+    ("buy", False): "long",
+    ("sell", False): "short",
+    ("buy", True): "short",
+    ("sell", True): "long",
+}
+
+
+def is_trigger_order(order) -> bool:
+    return hasattr(order, "trigger_price")
+
+
+class StateBook:
+    """ Positions and open orders of one account, kept in memory
+
+        Fed by deltas (update_positions / update_order, the same calls as
+        LiveView, from the private streams or from polling) and replaced by
+        the exchange state on reconcile(). Positions are kept by (pair,
+        side), orders by id and indexed by (pair, position side, reduce,
+        trigger), e.g. the reduce only orders of a BTC/USDT long are
+        open_orders("BTC/USDT", "long", reduce=True). Records are the adapter
+        ones (Position, Order, TriggerOrder).
+    """
+
+    def __init__(self):
+        self.positions = {}
+        self.orders = {}
+        self._index = {}
+        self.updated_at = None
+        self.reconciled_at = None
+        self._reconcile_task = None
+
+    @staticmethod
+    def _order_key(order) -> tuple:
+        return (order.pair, POSITION_SIDE[(order.side, order.reduce)], order.reduce, is_trigger_order(order))
+
+    def update_positions(self, positions, snapshot=False):
+        """ Positions of size 0 are removed, with snapshot=True the
+            positions missing from the list too
+        """
+        if snapshot:
+            self.positions = {}
+        for position in positions:
+            if position.size > 0:
+                self.positions[(position.pair, position.side)] = position
+            else:
+                self.positions.pop((position.pair, position.side), None)
+        self.updated_at = time.time()
+
+    def update_order(self, order, is_open):
+        self._remove_order(order.id)
+        if is_open:
+            self.orders[order.id] = order
+            self._index.setdefault(self._order_key(order), {})[order.id] = order
+        self.updated_at = time.time()
+
+    def _remove_order(self, order_id):
+        order = self.orders.pop(order_id, None)
+        if order is not None:
+            self._index[self._order_key(order)].pop(order_id, None)
+
+    def position(self, pair, side):
+        return self.positions.get((pair, side))
+
+    def order(self, order_id):
+        return self.orders.get(order_id)
+
+    def open_orders(self, pair, side, reduce=None, trigger=None) -> list:
+        """ Open orders opening (reduce=False) or reducing (reduce=True) the
+            pair position on side, trigger orders or not, None for both
+        """
+        reduces = [False, True] if reduce is None else [reduce]
+        triggers = [False, True] if trigger is None else [trigger]
+        return [
+            order
+            for reduce, trigger in itertools.product(reduces, triggers)
+            for order in self._index.get((pair, side, reduce, trigger), {}).values()
+        ]
+
+    def replace(self, positions, orders, pairs=None) -> list:
+        """ Replace the state of pairs (every pair if None) with the given
+            positions and open orders, returns the differences found
+        """
+        def kept(pair):
+            return pairs is not None and pair not in pairs
+
+        drift = []
+        new_positions = {(position.pair, position.side): position for position in positions if position.size > 0}
+        for key in set(self.positions) | set(new_positions):
+            if kept(key[0]):
+                continue
+            old, new = self.positions.get(key), new_positions.get(key)
+            old_size = old.size if old is not None else 0
+            new_size = new.size if new is not None else 0
+            if old_size != new_size:
+                drift.append(f"Position {key[0]} {key[1]}: {old_size} locally, {new_size} on the exchange")
+        new_ids = {order.id for order in orders}
+        for order_id, order in self.orders.items():
+            if not kept(order.pair) and order_id not in new_ids:
+                drift.append(f"Order {order_id} on {order.pair}: open locally, not on the exchange")
+        for order in orders:
+            if order.id not in self.orders:
+                drift.append(f"Order {order.id} on {order.pair}: open on the exchange, not locally")
+
+        self.positions = {key: position for key, position in self.positions.items() if kept(key[0])}
+        self.positions.update(new_positions)
+        for order_id in [order_id for order_id, order in self.orders.items() if not kept(order.pair)]:
+            self._remove_order(order_id)
+        for order in orders:
+            self.update_order(order, True)
+        self.updated_at = self.reconciled_at = time.time()
+        return drift
+
+    async def reconcile(self, exchange, pairs) -> list:
+        """ Replace the state of pairs with the one of the exchange (REST),
+            returns the differences found. Open orders are listed where the
+            adapter can (get_all_open_orders or get_open_orders).
+        """
+        tasks = [exchange.get_open_positions(pairs)]
+        if hasattr(exchange, "get_all_open_orders"):
+            tasks.append(exchange.get_all_open_orders(pairs))
+            if hasattr(exchange, "get_all_open_trigger_orders"):
+                tasks.append(exchange.get_all_open_trigger_orders(pairs))
+        elif hasattr(exchange, "get_open_orders"):
+            tasks.append(self._orders_by_pair(exchange, pairs))
+        positions, *orders_by_pair = await asyncio.gather(*tasks)
+        orders = [order for by_pair in orders_by_pair for pair_orders in by_pair.values() for order in pair_orders]
+        return self.replace(positions, orders, pairs)
+
+    @staticmethod
+    async def _orders_by_pair(exchange, pairs) -> dict:
+        orders = await asyncio.gather(*[exchange.get_open_orders(pair) for pair in pairs])
+        return dict(zip(pairs, orders))
+
+    def start_reconcile(self, exchange, pairs, interval=60):
+        """ Reconcile in the background every `interval` seconds, until
+            stop_reconcile(), the differences found are printed
+        """
+        async def reconcile_loop():
+            while True:
+                try:
+                    for line in await self.reconcile(exchange, pairs):
+                        print(f"State book reconciliation => {line}")
+                except Exception as e:
+                    print(f"Error reconciling the state book => {str(e)}")
+                await asyncio.sleep(interval)
+
+        if self._reconcile_task is None:
+            self._reconcile_task = asyncio.create_task(reconcile_loop())
+
+    def stop_reconcile(self):
+        if self._reconcile_task is not None:
+            self._reconcile_task.cancel()
+            self._reconcile_task = None
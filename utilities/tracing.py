@@ -0,0 +1,140 @@
+import contextlib
+import datetime
+import functools
+import inspect
+import json
+import os
+import time
+
+
+class Tracer:
+    """ Lightweight timing of strategy phases and exchange adapter calls
+
+        Usage:
+            tracer = Tracer("multi_bitget")
+            exchange = tracer.wrap(exchange)
+            with tracer.phase("ohlcv"):
+                ...
+            tracer.begin("orders")  # ends the previous begin() phase
+            ...
+            tracer.end()
+            tracer.write("metrics.jsonl")
+
+        Every phase and every async adapter method records its call count,
+        error count, total and max duration.
+    """
+
+    def __init__(self, strategy: str):
+        self.strategy = strategy
+        self.started_at = time.time()
+        self.phases = {}
+        self.calls = {}
+        self._current = None
+
+    @staticmethod
+    def _record(stats, name, duration, error):
+        entry = stats.setdefault(name, {"count": 0, "errors": 0, "total": 0.0, "max": 0.0})
+        entry["count"] += 1
+        entry["errors"] += int(error)
+        entry["total"] += duration
+        entry["max"] = max(entry["max"], duration)
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self._record(self.phases, name, time.perf_counter() - start, error)
+
+    def begin(self, name: str):
+        """ Start a phase that lasts until the next begin() or end() """
+        self.end()
+        self._current = (name, time.perf_counter())
+
+    def end(self, error: bool = False):
+        if self._current is not None:
+            name, start = self._current
+            self._record(self.phases, name, time.perf_counter() - start, error)
+            self._current = None
+
+    def wrap(self, exchange):
+        """ Trace every public coroutine method of an adapter, in place """
+        for name in dir(exchange):
+            if name.startswith("_"):
+                continue
+            method = getattr(exchange, name)
+            if inspect.iscoroutinefunction(method):
+                setattr(exchange, name, self._traced(name, method))
+        return exchange
+
+    def _traced(self, name, method):
+        @functools.wraps(method)
+        async def traced(*args, **kwargs):
+            start = time.perf_counter()
+            error = False
+            try:
+                return await method(*args, **kwargs)
+            except BaseException:
+                error = True
+                raise
+            finally:
+                self._record(self.calls, name, time.perf_counter() - start, error)
+
+        return traced
+
+    def summary(self) -> str:
+        lines = [f"Run time {time.time() - self.started_at:.2f}s"]
+        for title, stats in [("Phase", self.phases), ("Call", self.calls)]:
+            for name, entry in stats.items():
+                lines.append(
+                    f"{title} {name}: {entry['total']:.3f}s"
+                    f" ({entry['count']} calls, {entry['errors']} errors, max {entry['max']:.3f}s)"
+                )
+        return "\n".join(lines)
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for kind, label, stats in [("phase", "phase", self.phases), ("call", "method", self.calls)]:
+            metric = f"live_tools_{kind}"
+            lines.append(f"# TYPE {metric}_duration_seconds summary")
+            for name, entry in stats.items():
+                labels = f'strategy="{self.strategy}",{label}="{name}"'
+                lines.append(f"{metric}_duration_seconds_sum{{{labels}}} {entry['total']:.6f}")
+                lines.append(f"{metric}_duration_seconds_count{{{labels}}} {entry['count']}")
+            lines.append(f"# TYPE {metric}_errors_total counter")
+            for name, entry in stats.items():
+                labels = f'strategy="{self.strategy}",{label}="{name}"'
+                lines.append(f"{metric}_errors_total{{{labels}}} {entry['errors']}")
+        lines.append("# TYPE live_tools_run_timestamp_seconds gauge")
+        lines.append(f'live_tools_run_timestamp_seconds{{strategy="{self.strategy}"}} {self.started_at:.0f}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """ Save this run's metrics
+
+            A ".prom" path is overwritten in Prometheus text format (for the
+            node exporter textfile collector), any other path gets one JSON
+            line appended per run.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if path.endswith(".prom"):
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, path)
+            return
+        with open(path, "a") as f:
+            f.write(json.dumps({
+                "strategy": self.strategy,
+                "date": datetime.datetime.fromtimestamp(self.started_at).isoformat(),
+                "duration": time.time() - self.started_at,
+                "phases": self.phases,
+                "calls": self.calls,
+            }) + "\n")